@@ -1,6 +1,5 @@
 # TODO:
-# - make patterns follow geometry of bike. (refactor to usehorizontal position
-#   instead of index?)
+# - more geometry patterns (see layout.py), e.g. ones that move with speed.
 # - fancier patterns, apply differences in brightness, back and forth instead of
 #   one directional cycle.
 # - refactor events handling to be higher level? event streams, etc?
@@ -11,10 +10,8 @@
 #   speed somehow?)
 # - accelerometer: when stopped, changes to different pattern.
 
-import analogio
+import array
 import board
-import digitalio
-import simpleio
 import time
 
 try:
@@ -23,21 +20,63 @@ except ImportError:
     print('note: failed to import adafruit_dotstar')
 
 import neopixel
+import pixelbuffer
+import profiler
+
+import animations
+import inputs
 
 NLEDS = 44
 BRIGHT_MIN = 0.05
-BRIGHT_MAX = 0.50
+BRIGHT_MAX = 1.0  # the current budget is what really limits brightness
 BRIGHT_INC = 0.05
 BRIGHT_INIT = 0.2
+GAMMA = None  # e.g. 2.2 for perceptually even brightness steps
 
 DEBUG = 0
+# Print per-section tick times, fps and allocations every few seconds (see
+# lib/profiler.py).
+PROFILE = False
+PROF_SECTIONS = ('input', 'accel', 'step', 'render', 'show')
+PROF_INPUT, PROF_ACCEL, PROF_STEP, PROF_RENDER, PROF_SHOW = range(5)
 
 # try to cycle between full color palette in this many seconds
 TARGET_PALETTE_CYCLE_SEC = 6
 
-# This is actually a function of NLEDS, but i dunno exactly how. this value is
-# roughly right for 45 ¯\_(ツ)_/¯
-FULL_UPDATE_SEC = 0.04
+# The palette moves by a fractional number of entries each frame. Colors are
+# blended between neighboring entries at this many sub-steps per entry.
+SUBSTEPS = 4
+
+# Weight of the newest frame in the measured frame period average.
+FRAME_PERIOD_EWMA = 0.1
+
+# WS2812 timing: 24 bits per LED at 800kHz, then a latch. No frame can be
+# shorter than this, whatever the loop does.
+NEO_BIT_SEC = 1.25e-6
+NEO_LATCH_SEC = 80e-6
+
+# RAM budget for pre-rendered palette frames (see FrameCache). A palette costs
+# 3 * (len(palette) + NLEDS) * SUBSTEPS bytes, so this fits the largest
+# palette plus a feedback palette.
+FRAME_CACHE_BYTES = 6 * 1024
+
+# Estimated strip current. Per LED: LED_CHANNEL_UA microamps per unit (0-255)
+# of each of r, g, b, plus LED_IDLE_MA whatever it shows. These are typical
+# WS2812B figures (~20mA per channel at full); test_sketches/
+# led_current_test.py measures the real ones.
+LED_CHANNEL_UA = (78, 78, 78)  # r, g, b
+LED_IDLE_MA = 1
+# Palettes are dimmed below the set brightness where needed to keep the
+# estimated draw under this. None for no limit.
+POWER_BUDGET_MA = 500
+
+# Estimated draw (mA) of a frame of wire (GRB) bytes, rounded up.
+def frame_ma(buf):
+    wr, wg, wb = LED_CHANNEL_UA
+    total = 0
+    for j in range(0, len(buf), 3):
+        total += buf[j] * wg + buf[j+1] * wr + buf[j+2] * wb
+    return len(buf) // 3 * LED_IDLE_MA + -(-total // 1000)
 
 WHITE = (255,255,255)
 BLACK = (0,0,0)
@@ -46,78 +85,211 @@ RED = (255,0,0)
 def timestamp():
     return time.monotonic()
 
-class Button(object):
-    def __init__(self, pin):
-        self._but = digitalio.DigitalInOut(pin)
-        self._but.direction = digitalio.Direction.INPUT
-        self._but.pull = digitalio.Pull.UP
-        self._prev_is_pressed = self._is_pressed()
-
-    def _is_pressed(self):
-        return not self._but.value
-
-    # This only returns true if button is pressed and wasn't pressed the last
-    # time get_press was called.
-    def get_press(self):
-        prev_pressed = self._prev_is_pressed
-        cur_pressed = self._is_pressed()
-        self._prev_is_pressed = cur_pressed
-        ret =  cur_pressed and not prev_pressed
-        if DEBUG >= 2:
-            print('but: {}\t[ cur:{}\t prev:{} ]'.format(ret, cur_pressed, prev_pressed))
-        return ret
-
-
-class Accel(object):
-    EWMA_WEIGHT = 0.2  # for new points
-    SIZABLE_MOVE_THRESH = 0.08
-    IDLE_DELAY = 10
-
-    def __init__(self, pin_x, pin_y, pin_z):
-        self._x = analogio.AnalogIn(pin_x)
-        self._y = analogio.AnalogIn(pin_y)
-        self._z = analogio.AnalogIn(pin_z)
-        self._prev_read = (0, 0, 0)
-        self._prev_time = 0
-        self._last_sizable_move_time = timestamp()
-        self._mq_ewma = 0
-
-    def _read(self):
-        def cook(axis):
-            val = axis.value / 65536
-            val -= 0.5  # Shift values to true center (0.5).
-            return val * 3.0  # Convert to gravities.
-        return cook(self._x), cook(self._y), cook(self._z)
-
-    def is_moving(self):
-        def sq_dist(a, b):
-            (x1,y1,z1), (x2,y2,z2) = a, b
-            return (x2 - x1) ** 2 + (y2-y1) ** 2 + (z2-z1) ** 2
-        pread, ptime = self._prev_read, self._prev_time
-        nread, ntime = self._read(), timestamp()
-        daccel = sq_dist(pread, nread)
-        dtime = (ntime - ptime)
-        accel_change =  daccel / dtime
-        self._mq_ewma = (self.EWMA_WEIGHT * accel_change
-                         + (1-self.EWMA_WEIGHT) * self._mq_ewma)
-        self._prev_read = nread
-        self._prev_time = ntime
-        if self._mq_ewma > self.SIZABLE_MOVE_THRESH:
-            if DEBUG >= 2: print('sizable move!! {} > {}'.format(self._mq_ewma, self.SIZABLE_MOVE_THRESH))
-            self._last_sizable_move_time = ntime
-        idle_time = ntime - self._last_sizable_move_time
-        moving = idle_time < self.IDLE_DELAY
-        if DEBUG >= 2:
-            print('acc: {}\t[ ({:.2f},{:.2f},{:.2f})\t da/dt:{:.4f}/{:.1f}\t cng:{:.4f}\t ewma:{:.3f}\t idle:{:.1f} ]'.format(
-                moving, nread[0], nread[1], nread[2], daccel, dtime,
-                accel_change, self._mq_ewma, idle_time))
-        return moving
+# Pre-renders palettes into GRB wire bytes, scaled to the current brightness.
+#
+# Instead of storing a frame per shift, each palette is rendered once repeated
+# out to len(palette) + num_leds pixels. The frame for any shift is then the
+# slice [3*shift : 3*(shift + num_leds)], so drawing a frame is a single buffer
+# copy with no per-pixel indexing, modulo or brightness math.
+#
+# Fractional shifts get their own copy per sub-step, with every pixel already
+# blended that fraction of the way towards the next palette entry.
+#
+# Rendering is integer-only: brightness (and gamma, if given) is applied
+# through a 256-entry table, rebuilt only when brightness changes.
+#
+# With a current budget, each palette's draw is also estimated for every
+# frame that can be drawn from it: at every shift in strip order, and through
+# the layout's runs if there are any (see set_runs), since a mapped frame
+# shows different parts of the palette at once. The worst one is found once
+# per palette, at full brightness. Draw is linear in brightness, so scaling
+# that bounds the draw at any other brightness (see _scaled_ma), and a
+# palette that's over budget is rendered dimmed just enough to fit without
+# summing its frames again.
+class FrameCache(object):
+    def __init__(self, num_leds, max_bytes=FRAME_CACHE_BYTES, gamma=None,
+                 budget_ma=None):
+        self._num = num_leds
+        self._max_bytes = max_bytes
+        self._gamma = gamma
+        self.budget_ma = budget_ma
+        self.runs = None
+        self._bright = 1.0
+        self._lut = pixelbuffer.brightness_table(1.0, gamma)
+        self._frames = {}  # id(palette) -> (frames, peak_ma, brightness)
+        self._lru = []  # palette ids, least recently used first
+        self._nbytes = 0
+        # id(palette) -> its worst-case draw (uA) at full brightness. Kept
+        # across brightness changes, cleared by set_runs.
+        self._peaks = {}
+        # Gamma rounding's worst case, for _scaled_ma.
+        self._slack_ua = 0 if gamma is None else num_leds * sum(LED_CHANNEL_UA)
+        self._single_colors = None
+        self._single = None
+        # For the palette last returned by get(): its estimated worst-case
+        # draw, and the brightness it was rendered at (lower than the set one
+        # if it was dimmed to fit the budget).
+        self.peak_ma = 0
+        self.bright = 1.0
+
+    # True if the palette last returned by get() was dimmed.
+    @property
+    def limited(self):
+        return self.bright < self._bright
+
+    def set_brightness(self, bright):
+        if bright != self._bright:
+            self._bright = bright
+            self._lut = pixelbuffer.brightness_table(bright, self._gamma)
+            self.clear()
+
+    def clear(self):
+        self._frames = {}
+        self._lru = []
+        self._nbytes = 0
+        self._single_colors = None
+
+    # Frames can also be drawn through runs (see layout.index_runs), which
+    # the draw estimates then cover.
+    def set_runs(self, runs):
+        self.runs = runs
+        self._peaks = {}
+        self.clear()
+
+    # Returns the rendered frames: a copy of the strip per sub-step, each
+    # ncolors + num_leds pixels long.
+    def _render(self, colors, substeps, lut):
+        ncolors = palette_len(colors)
+        npix = ncolors + self._num
+        buf = bytearray(3 * npix * substeps)
+        j = 0
+        for sub in range(substeps):
+            for i in range(npix):
+                a = 3 * (i % ncolors)
+                b = 3 * ((i + 1) % ncolors)
+                r1, g1, b1 = colors[a], colors[a+1], colors[a+2]
+                r2, g2, b2 = colors[b], colors[b+1], colors[b+2]
+                buf[j] = lut[g1 + (g2 - g1) * sub // substeps]
+                buf[j+1] = lut[r1 + (r2 - r1) * sub // substeps]
+                buf[j+2] = lut[b1 + (b2 - b1) * sub // substeps]
+                j += 3
+        return memoryview(buf)
+
+    # The highest draw (uA, LEDs' idle draw aside) of any frame drawn from
+    # colors at full brightness, in strip order and through the runs.
+    def _peak_ua(self, colors, substeps):
+        ncolors = palette_len(colors)
+        num = self._num
+        row = ncolors + num + 1
+        wr, wg, wb = LED_CHANNEL_UA
+        lut = pixelbuffer.brightness_table(1.0, self._gamma)
+        # Each sub-step's row of pixel draws as running sums, so the draw of
+        # any span of a row is a difference of two.
+        sums = array.array('i', [0] * (row * substeps))
+        for sub in range(substeps):
+            total = 0
+            k = sub * row
+            for i in range(row - 1):
+                a = 3 * (i % ncolors)
+                b = 3 * ((i + 1) % ncolors)
+                r1, g1, b1 = colors[a], colors[a+1], colors[a+2]
+                r2, g2, b2 = colors[b], colors[b+1], colors[b+2]
+                total += (lut[r1 + (r2 - r1) * sub // substeps] * wr +
+                          lut[g1 + (g2 - g1) * sub // substeps] * wg +
+                          lut[b1 + (b2 - b1) * sub // substeps] * wb)
+                k += 1
+                sums[k] = total
+        peak = 0
+        for sub in range(substeps):
+            k = sub * row
+            for c in range(k, k + ncolors):
+                draw = sums[c + num] - sums[c]
+                if draw > peak:
+                    peak = draw
+        if self.runs:
+            # As Neos.set_colors_mapped draws them.
+            period = ncolors * substeps
+            for pos in range(period):
+                draw = 0
+                for (_, count, index) in self.runs:
+                    p = (pos + index) % period
+                    k = (p % substeps) * row + p // substeps
+                    draw += sums[k + count] - sums[k]
+                if draw > peak:
+                    peak = draw
+        return peak
+
+    # Bound on the draw (mA) of frames whose full-brightness peak is peak
+    # (uA), rendered at bright: int(v * bright) is at most bright times v,
+    # though gamma's rounding can add up to a step per channel. Rounded up,
+    # like frame_ma().
+    def _scaled_ma(self, peak, bright):
+        draw = bright * peak + self._slack_ua
+        return self._num * LED_IDLE_MA + int(-(-draw // 1000))
+
+    # Renders colors, dimmed if needed to keep under the current budget.
+    def _render_limited(self, colors, substeps):
+        # Palettes are module-level buffers, so their peaks are keyed by
+        # identity like their frames. Single colors are cheap to sum.
+        key = id(colors)
+        peak = self._peaks.get(key) if substeps > 1 else None
+        if peak is None:
+            peak = self._peak_ua(colors, substeps)
+            if substeps > 1:
+                self._peaks[key] = peak
+        bright = self._bright
+        peak_ma = self._scaled_ma(peak, bright)
+        budget = self.budget_ma
+        # An all-black palette can't be dimmed (a budget under the idle draw
+        # can't be met).
+        if budget is None or peak_ma <= budget or not peak:
+            return self._render(colors, substeps, self._lut), peak_ma, bright
+        idle = self._num * LED_IDLE_MA
+        # Less 1uA, so float rounding can't push the bound over.
+        bright = max(0, 1000 * (budget - idle) - self._slack_ua - 1) / peak
+        peak_ma = self._scaled_ma(peak, bright)
+        lut = pixelbuffer.brightness_table(bright, self._gamma)
+        if DEBUG >= 1: print('power: dimmed palette to {:.2f}'.format(bright))
+        return self._render(colors, substeps, lut), peak_ma, bright
+
+    # Rendered frames for a palette. Palettes are module-level buffers, so
+    # they're keyed by identity. Single colors are cheap and short-lived, so
+    # they bypass the cache, except that the last one is kept (by value) for
+    # transitions that draw the same one every frame.
+    def get(self, colors):
+        if len(colors) == 3:
+            if colors != self._single_colors:
+                self._single_colors = bytes(colors)
+                self._single = self._render_limited(colors, 1)
+            frames, self.peak_ma, self.bright = self._single
+            return frames
+        key = id(colors)
+        entry = self._frames.get(key)
+        if entry is not None:
+            if self._lru[-1] != key:
+                self._lru.remove(key)
+                self._lru.append(key)
+            frames, self.peak_ma, self.bright = entry
+            return frames
+        entry = self._render_limited(colors, SUBSTEPS)
+        frames = entry[0]
+        while self._lru and self._nbytes + len(frames) > self._max_bytes:
+            old = self._frames.pop(self._lru.pop(0))
+            self._nbytes -= len(old[0])
+        self._frames[key] = entry
+        self._lru.append(key)
+        self._nbytes += len(frames)
+        if DEBUG >= 1: print('frame cache: {} palettes, {} bytes'.format(len(self._lru), self._nbytes))
+        frames, self.peak_ma, self.bright = entry
+        return frames
 
 
 class Neos(object):
-    def __init__(self, pin, num_leds):
+    def __init__(self, pin, num_leds, gamma=GAMMA, budget_ma=POWER_BUDGET_MA):
         self._num = num_leds
-        self._neos = neopixel.NeoPixel(pin, num_leds, auto_write=False)
+        # Brightness is baked into the cached frames, not applied here.
+        self._pixels = pixelbuffer.PixelBuffer(pin, num_leds)
+        self._cache = FrameCache(num_leds, gamma=gamma, budget_ma=budget_ma)
         self.brightness = BRIGHT_INIT
 
     @property
@@ -126,120 +298,235 @@ class Neos(object):
 
     @brightness.setter
     def brightness(self, val):
-        self._neos.brightness = max(BRIGHT_MIN, min(BRIGHT_MAX, val))
+        self._cache.set_brightness(max(BRIGHT_MIN, min(BRIGHT_MAX, val)))
         self._brightness = val
 
-    def set_colors(self, colors, shift=0, wave=False):
+    # Shortest possible frame: the time to clock the buffer out to the strip.
+    @property
+    def min_frame_period(self):
+        return len(self._pixels.buf) * 8 * NEO_BIT_SEC + NEO_LATCH_SEC
+
+    # Unchanged frames aren't sent again (see PixelBuffer.show).
+    def show(self):
+        self._pixels.show()
+
+    # Sends a frame mixed from two others, as the transitions in
+    # animations.py draw: each of those is within the current budget, but
+    # taking some pixels from each can draw more than either, so the mix is
+    # dimmed first if it's over.
+    def show_mix(self):
+        budget = self._cache.budget_ma
+        buf = self._pixels.buf
+        if budget is not None:
+            draw = frame_ma(buf)
+            idle = self._num * LED_IDLE_MA
+            if draw > budget and draw > idle:
+                scale = 256 * max(0, budget - idle) // (draw - idle)
+                for j in range(len(buf)):
+                    buf[j] = buf[j] * scale >> 8
+        self._pixels.show()
+
+    # (sent, skipped) frame counts since the last call.
+    def stats(self):
+        return self._pixels.stats()
+
+    @property
+    def num_leds(self):
+        return self._num
+
+    # The pixel buffer, for transitions that mix frames into it directly.
+    @property
+    def buf(self):
+        return self._pixels.buf
+
+    def write(self, data, start=0):
+        self._pixels.write(data, start)
+
+    # The wire bytes for a whole strip of colors at shift, without drawing
+    # them. colors is a palette (see gradient) or a single RGB tuple. shift
+    # may be fractional, in which case the frame is blended between palette
+    # entries (to the nearest 1/SUBSTEPS).
+    def frame(self, colors, shift=0):
         if type(colors) is tuple:
-            colors = [colors]
-        for i in range(self._num):
-            i = self._num - 1 - i
-            self._neos[i] = colors[(i + shift) % len(colors)]
-            if wave:
-                self._neos.show()
-        if not wave:
-            self._neos.show()
+            colors = bytes(colors)
+        ncolors = palette_len(colors)
+        frames = self._cache.get(colors)
+        stride = 3 * (ncolors + self._num)
+        nsub = len(frames) // stride
+        pos = int(shift * nsub) % (ncolors * nsub)
+        start = (pos % nsub) * stride + 3 * (pos // nsub)
+        return frames[start:start + 3 * self._num]
+
+    # Draws a frame (see frame()), and sends it unless show is False. For a
+    # gradual change from one palette to another, see the transitions in
+    # animations.py.
+    def set_colors(self, colors, shift=0, show=True):
+        self._pixels.write(self.frame(colors, shift))
+        if show:
+            self.show()
+
+    # Like set_colors, but each pixel's palette position comes from an index
+    # table (see layout.index_runs) instead of its place on the strip. Each
+    # run of pixels showing consecutive entries is a single slice copy.
+    def set_colors_mapped(self, colors, shift, runs, show=True):
+        if runs is not self._cache.runs:
+            # The budget needs to cover these frames too.
+            self._cache.set_runs(runs)
+        ncolors = palette_len(colors)
+        frames = self._cache.get(colors)
+        stride = 3 * (ncolors + self._num)
+        nsub = len(frames) // stride
+        pos = int(shift * nsub)
+        period = ncolors * nsub
+        write = self._pixels.write
+        for (led, count, index) in runs:
+            p = (pos + index) % period
+            start = (p % nsub) * stride + 3 * (p // nsub)
+            write(frames[start:start + 3 * count], led)
+        if show:
+            self.show()
+
+    # Estimated worst-case draw (mA) of the last palette drawn, and whether
+    # it's being dimmed to stay under the current budget.
+    @property
+    def peak_ma(self):
+        return self._cache.peak_ma
 
+    @property
+    def power_limited(self):
+        return self._cache.limited
 
+    # Returns True if brightness hit the max (or the current budget, for the
+    # last palette drawn), for the caller's feedback.
     def inc_brightness(self):
+        if self.power_limited:
+            if DEBUG >= 1: print('inc_bright: at power budget: ', self.brightness)
+            return True
         new_bright = self.brightness + BRIGHT_INC
         if new_bright >= BRIGHT_MAX:
             self.brightness = BRIGHT_MAX
             if DEBUG >= 1: print('inc_bright: hit max: ', self.brightness)
-            self.set_colors(BLACK)
-            for i in range(8):
-                time.sleep(0.05)
-                self.set_colors([BLACK, RED, RED, RED], i)
-            time.sleep(0.1)
-        else:
-            self.brightness = new_bright
-            if DEBUG >= 1: print('inc_bright: ', self.brightness)
+            return True
+        self.brightness = new_bright
+        if DEBUG >= 1: print('inc_bright: ', self.brightness)
+        return False
 
+    # Returns True if brightness hit the min, for the caller's feedback.
     def dec_brightness(self):
-        new_bright = self.brightness - BRIGHT_INC
+        # Step down from what's showing, not from a setting the budget is
+        # already holding it under.
+        new_bright = min(self.brightness, self._cache.bright) - BRIGHT_INC
         if new_bright <= BRIGHT_MIN:
             self.brightness = BRIGHT_MIN
             if DEBUG >= 1: print('dec_bright: hit min: ', self.brightness)
-            self.set_colors(BLACK)
-            for i in range(8):
-                time.sleep(0.05)
-                self.set_colors([BLACK, BLACK, BLACK, RED], i)
-            time.sleep(0.1)
-        else:
-            self.brightness = new_bright
-            if DEBUG >= 1: print('dec_bright: ', self.brightness)
-
-
-def smoothify(n, xs):
-    def intavg(x, y):
-        return int((x + y) / 2)
-    def avgrgb(rgb1, rgb2):
-        (r1,g1,b1), (r2,g2,b2) = (rgb1, rgb2)
-        return (intavg(r1, r2),
-                intavg(g1, g2),
-                intavg(b1, b2))
-    def smooth(xs):
-        ys = []
-        for i in range(len(xs)):
-            ys.append(xs[i])
-            next_x = xs[0] if i == len(xs) - 1 else xs[i+1]
-            ys.append(avgrgb(xs[i], next_x))
-        return ys
-    def call_n_times(f, x, n):
-        if n == 0:
-            return x
-        return call_n_times(f, f(x), n-1)
-    return call_n_times(smooth, xs, n)
-
-
-# RGB = smoothify(7, [(255, 0, 0),
-#                     (0, 255, 0),
-#                     (0, 0, 255)])
-
-ORANGE_PURPLE = smoothify(5, [(150, 50, 0),
-                              (125, 0, 125)])
-ORANGE_PURPLE_BLANK = smoothify(3, [(0, 0, 0), (0, 0, 0),
-                                    (150, 50, 0),
-                                    (125, 0, 125),
-                                    (150, 50, 0),
-                                    ])
-PURPLE_BLUE_BLANK = smoothify(4, [(0,0,0),
-                            (205, 0, 125),
-                            (0, 80, 125),
-                            (205, 0, 125),
-                            ])
-PURPLE_BLUE = smoothify(4, [(205, 0, 125),
-                            (0, 80, 125),
-                            ])
-GREEN_BLUE = smoothify(6, [(0, 170, 80),
-                           (30, 80, 150)])
-BLUE_GREEN_BLANK = smoothify(3, [(0, 0, 0), (0, 0, 0),
-                                 (0, 50, 100),
-                                 (0, 130, 60),
-                                 (0, 50, 100),
-                                ])
-PINK_PURPLE_BLANK = smoothify(3, [(0, 0, 0),
-                             (180, 0, 90),
-                             (100, 0, 125),
-                             (180, 0, 90)])
+            return True
+        self.brightness = new_bright
+        if DEBUG >= 1: print('dec_bright: ', self.brightness)
+        return False
+
+
+# Palettes are cyclic color gradients packed as RGB bytes, 3 per entry. That's
+# about a tenth of the RAM of a list of tuples on the board.
+def palette_len(palette):
+    return len(palette) // 3
+
+
+def palette_bytes(colors):
+    buf = bytearray(3 * len(colors))
+    for (i, rgb) in enumerate(colors):
+        buf[3*i:3*i + 3] = bytes(rgb)
+    return buf
+
+
+_GRADIENTS = {}
+
+# Cyclic gradient through stops (RGB tuples), computed directly at n entries.
+# Interpolation is linear in 0-255 values, like repeatedly averaging
+# neighbors, or in linear light if gamma is given (e.g. 2.2), which keeps
+# blends between saturated colors from going dim in the middle. Results are
+# memoized, so the same stops and length share one buffer.
+def gradient(stops, n, gamma=None):
+    key = (tuple(stops), n, gamma)
+    palette = _GRADIENTS.get(key)
+    if palette is not None:
+        return palette
+    nstops = len(stops)
+    palette = bytearray(3 * n)
+    j = 0
+    if gamma is None:
+        # All integer math, floats are software-emulated on the M0.
+        for i in range(n):
+            # entry i is rem/n of the way from stop k to the next one.
+            k, rem = divmod(i * nstops, n)
+            (r1, g1, b1), (r2, g2, b2) = stops[k], stops[(k + 1) % nstops]
+            palette[j] = r1 + (r2 - r1) * rem // n
+            palette[j+1] = g1 + (g2 - g1) * rem // n
+            palette[j+2] = b1 + (b2 - b1) * rem // n
+            j += 3
+    else:
+        lin = [[(ch / 255) ** gamma for ch in rgb] for rgb in stops]
+        inv = 1 / gamma
+        for i in range(n):
+            k, rem = divmod(i * nstops, n)
+            frac = rem / n
+            a, b = lin[k], lin[(k + 1) % nstops]
+            for ch in range(3):
+                palette[j] = int(255 * (a[ch] + (b[ch] - a[ch]) * frac) ** inv)
+                j += 1
+    _GRADIENTS[key] = palette
+    return palette
+
+
+# RGB = gradient([(255, 0, 0),
+#                 (0, 255, 0),
+#                 (0, 0, 255)], 384)
+
+ORANGE_PURPLE = gradient([(150, 50, 0),
+                          (125, 0, 125)], 64)
+ORANGE_PURPLE_BLANK = gradient([(0, 0, 0), (0, 0, 0),
+                                (150, 50, 0),
+                                (125, 0, 125),
+                                (150, 50, 0),
+                                ], 40)
+PURPLE_BLUE_BLANK = gradient([(0,0,0),
+                              (205, 0, 125),
+                              (0, 80, 125),
+                              (205, 0, 125),
+                              ], 64)
+PURPLE_BLUE = gradient([(205, 0, 125),
+                        (0, 80, 125),
+                        ], 32)
+GREEN_BLUE = gradient([(0, 170, 80),
+                       (30, 80, 150)], 128)
+BLUE_GREEN_BLANK = gradient([(0, 0, 0), (0, 0, 0),
+                             (0, 50, 100),
+                             (0, 130, 60),
+                             (0, 50, 100),
+                             ], 40)
+PINK_PURPLE_BLANK = gradient([(0, 0, 0),
+                              (180, 0, 90),
+                              (100, 0, 125),
+                              (180, 0, 90)], 32)
 PALETTES = [PURPLE_BLUE_BLANK, ORANGE_PURPLE_BLANK, PINK_PURPLE_BLANK, BLUE_GREEN_BLANK, PURPLE_BLUE, ORANGE_PURPLE, GREEN_BLUE]
-PALETTE_INDEX = 0
 
-IDLE_PALETTE = smoothify(3, [
-    (0,0,0), (0,0,0), (180, 20, 30)])
-CHANGE_BUTTON_PALETTE = smoothify(2, [(0, 0, 0),
-                                      (0, 0, 0),
-                                      (180, 0, 180)])
-CHANGE_SPEED_PALETTE = smoothify(2, [(0, 180, 0),
-                                     (80, 150, 80),
-                                     (0, 0, 0),
-                                     (0, 0, 0)])
+IDLE_PALETTE = gradient([
+    (0,0,0), (0,0,0), (180, 20, 30)], 24)
+CHANGE_BUTTON_PALETTE = gradient([(0, 0, 0),
+                                  (0, 0, 0),
+                                  (180, 0, 180)], 12)
+CHANGE_SPEED_PALETTE = gradient([(0, 180, 0),
+                                 (80, 150, 80),
+                                 (0, 0, 0),
+                                 (0, 0, 0)], 16)
+BRIGHT_MAX_PALETTE = palette_bytes([BLACK, RED, RED, RED])
+BRIGHT_MIN_PALETTE = palette_bytes([BLACK, BLACK, BLACK, RED])
 
 
 
 ## LEDs
 
 def try_get_board_neo():
+    board_neo = None
     try:
         board_neo = neopixel.NeoPixel(board.NEOPIXEL, 1)
     except AttributeError:
@@ -262,95 +549,206 @@ def try_get_board_neo():
     return None
 
 
-board_led = simpleio.DigitalOut(board.D13)
-board_led.value = True
-
-board_neo = try_get_board_neo()
-
-neos = Neos(board.D12, NLEDS)
-
-## accel
-accel = Accel(board.A3, board.A4, board.A5)
-
-## palette button
-palette_but = Button(board.D11)
-
-## up/down brightness buttons
-up_but = Button(board.D10)
-down_but = Button(board.D9)
-
 # won't go into idle pattern until this many seconds after last palette change.
 MIN_NEW_PALETTE_TIME = 3
-last_palette_change_time = 0
+# How the strip goes from one palette to the next when going idle or active
+# (a transition from animations.py), and how long each half takes: out to
+# black, then in to the new palette.
+IDLE_TRANSITION = animations.wipe
+IDLE_TRANSITION_SEC = 0.4
+
+# Low-power idle: once the idle palette is up and nothing else is
+# happening, frames are at least IDLE_FRAME_SEC apart, sleeping in between
+# (CircuitPython's time.sleep light-sleeps where the port can), the board LED
+# is off and the accelerometer drops to its wake-up rate. Motion or a button
+# press brings back the full rate within about IDLE_FRAME_SEC plus one wake
+# sample period (motion.WAKE_SAMPLE_HZ).
+IDLE_FRAME_SEC = 1 / 20
 
-# TODO: push into neos?.
-palette = PALETTES[PALETTE_INDEX]
 SPEEDS = [0.5, 1, 4, 8]
-SPEED_INDEX = 1
-
-i = 0
-
-while True:
-    now = timestamp()
-    if DEBUG >= 2: print()
-    board_led.value = not board_led.value
-
-    ## Brightness buttons
-    up_press, down_press = up_but.get_press(), down_but.get_press()
-    if up_press and down_press:
-        # Special speed hack.
-        SPEED_INDEX = (SPEED_INDEX + 1) % len(SPEEDS)
-        print('speed change:', SPEED_INDEX)
-        for i in range(10):
-            neos.set_colors(CHANGE_SPEED_PALETTE, int(i * (SPEED_INDEX+1)))
-            time.sleep(.1 / (SPEED_INDEX+1))
-    elif up_press:
-        neos.inc_brightness()
-    elif down_press:
-        neos.dec_brightness()
-
-    ## Palette button
-    if palette_but.get_press():
-        for i in range(10):
-            neos.set_colors(CHANGE_BUTTON_PALETTE, i)
-        PALETTE_INDEX = (PALETTE_INDEX + 1) % len(PALETTES)
-        palette = PALETTES[PALETTE_INDEX]
-        last_palette_change_time = now
-
-    ## Accel
-    is_moving = accel.is_moving()
-
-    if (not is_moving
-        and now - last_palette_change_time > MIN_NEW_PALETTE_TIME
-        and palette != IDLE_PALETTE):
-        print('now idle..')
-        palette = IDLE_PALETTE
-        last_palette_change_time = now
-        neos.set_colors(BLACK, wave=True)
-        neos.set_colors(palette, wave=True)
-    elif (is_moving
-          and now - last_palette_change_time > MIN_NEW_PALETTE_TIME / 2  # less
-          and palette == IDLE_PALETTE):
-        print('now active..')
-        palette = PALETTES[PALETTE_INDEX]
-        last_palette_change_time = now
-        neos.set_colors(BLACK, wave=True)
-        neos.set_colors(palette, wave=True)
-
-    ## Iterate palette
-
-    raw_step = len(palette) * FULL_UPDATE_SEC / TARGET_PALETTE_CYCLE_SEC
-    mult = raw_step * SPEEDS[SPEED_INDEX]
-    step = min(max(int(round(mult)), 1),
-               int(len(palette) / 2))
-
-    i = (i + step) % len(palette)
-    if DEBUG >= 2:
-        print('i:', i, '\tstp:', step, '\t[ raw:', raw_step, ' ]')
-
-    if DEBUG >= 2:
-        print('mv:{} \t\tstp:{}'.format(is_moving, step))
-
-    neos.set_colors(palette, shift=i)
-    if board_neo:
-        board_neo[0] = palette[i]
+
+# Button indexes in the inputs.Buttons passed to Engine.
+PALETTE_KEY = 0
+UP_KEY = 1
+DOWN_KEY = 2
+# Pressing up and down together changes speed.
+BUTTON_CHORDS = [(UP_KEY, DOWN_KEY)]
+SPEED_CHORD = 0
+
+
+# Owns all of the controller's state. Each tick(now) polls the buttons and
+# accelerometer once and draws one frame, so a caller can drive it for a fixed
+# number of frames (benchmarks) or forever via run() (code.py). Feedback
+# animations run one frame per tick in place of the pattern, which keeps
+# moving underneath them.
+class Engine(object):
+    # layout_runs, if given, maps pixels to palette positions by where they
+    # are on the bike (see layout.index_runs) rather than by strip order.
+    def __init__(self, neos, accel, buttons, board_led=None, board_neo=None,
+                 layout_runs=None):
+        self.neos = neos
+        self.accel = accel
+        self.buttons = buttons
+        self.layout_runs = layout_runs
+        self.board_led = board_led
+        self.board_neo = board_neo
+        self._board_neo_color = None  # (palette, offset) it's showing
+
+        self.palette_index = 0
+        self.speed_index = 1
+        # TODO: push into neos?.
+        self.palette = PALETTES[self.palette_index]
+        self.pos = 0.0  # fractional palette shift
+        self.last_palette_change_time = 0
+        self.last_tick = None
+        self.frame_period = 0.0  # seconds, moving average
+        self.frames = 0
+        self.anims = animations.Animator()
+        self.low_power = False
+        # Time spent in tick() vs. asleep in run(), for duty_cycle().
+        self.busy_sec = 0.0
+        self.sleep_sec = 0.0
+        self.prof = profiler.create(PROF_SECTIONS, enabled=PROFILE)
+
+    def tick(self, now):
+        prof = self.prof
+        prof.start()
+        if DEBUG >= 2: print()
+        if self.board_led and not self.low_power:
+            self.board_led.value = not self.board_led.value
+        neos = self.neos
+
+        ## Buttons
+        for (kind, key, _t) in self.buttons.update(now):
+            if DEBUG >= 1: print('button: {} {}'.format(kind, key))
+            if kind == inputs.CHORD and key == SPEED_CHORD:
+                self.speed_index = (self.speed_index + 1) % len(SPEEDS)
+                print('speed change:', self.speed_index)
+                mult = self.speed_index + 1
+                self.anims.play(animations.palette_frames(
+                    neos, CHANGE_SPEED_PALETTE, range(0, 10 * mult, mult), .1 / mult))
+            elif kind != inputs.PRESS:
+                continue
+            elif key == UP_KEY:
+                if neos.inc_brightness():
+                    self.anims.play(animations.limit_flash(neos, BRIGHT_MAX_PALETTE))
+            elif key == DOWN_KEY:
+                if neos.dec_brightness():
+                    self.anims.play(animations.limit_flash(neos, BRIGHT_MIN_PALETTE))
+            elif key == PALETTE_KEY:
+                self.anims.play(animations.palette_frames(
+                    neos, CHANGE_BUTTON_PALETTE, range(10)))
+                self.palette_index = (self.palette_index + 1) % len(PALETTES)
+                self.palette = PALETTES[self.palette_index]
+                self.last_palette_change_time = now
+
+        prof.lap(PROF_INPUT)
+
+        ## Accel
+        is_moving = self.accel.is_moving(now)
+
+        since_change = now - self.last_palette_change_time
+        if (not is_moving
+            and since_change > MIN_NEW_PALETTE_TIME
+            and self.palette is not IDLE_PALETTE):
+            print('now idle..')
+            self._transition(IDLE_PALETTE, now)
+        elif (is_moving
+              and since_change > MIN_NEW_PALETTE_TIME / 2  # less
+              and self.palette is IDLE_PALETTE):
+            print('now active..')
+            self._transition(PALETTES[self.palette_index], now)
+
+        prof.lap(PROF_ACCEL)
+
+        ## Iterate palette, by however far the measured frame time says we
+        ## should have moved.
+        palette = self.palette
+        step = 0
+        if self.last_tick is not None:
+            dt = now - self.last_tick
+            self.frame_period += FRAME_PERIOD_EWMA * (dt - self.frame_period)
+            step = (palette_len(palette) * SPEEDS[self.speed_index] * dt
+                    / TARGET_PALETTE_CYCLE_SEC)
+            # More than half a palette per frame looks like it's going
+            # backwards, so a very slow frame falls behind instead.
+            step = min(step, palette_len(palette) / 2)
+        self.last_tick = now
+        self.pos = (self.pos + step) % palette_len(palette)
+
+        if DEBUG >= 2:
+            print('mv:{} \t\tpos:{:.2f}\tstp:{:.3f}'.format(is_moving, self.pos, step))
+        if DEBUG >= 1 and self.frames % 100 == 0:
+            sent, skipped = neos.stats()
+            print('frame: {:.2f}ms (strip min {:.2f}ms) sent/skipped: {}/{} duty: {:.1f}%'.format(
+                self.frame_period * 1000, neos.min_frame_period * 1000,
+                sent, skipped, self.duty_cycle() * 100))
+
+        prof.lap(PROF_STEP)
+
+        # Animations draw and send their own frames.
+        drawn = self.anims.step(now)
+        if not drawn and self.layout_runs:
+            neos.set_colors_mapped(palette, self.pos, self.layout_runs,
+                                   show=False)
+        elif not drawn:
+            neos.set_colors(palette, shift=self.pos, show=False)
+        prof.lap(PROF_RENDER)
+        if not drawn:
+            neos.show()
+        if self.board_neo:
+            # Assigning writes the pixel out, so only do it on a change.
+            k = 3 * (int(self.pos) % palette_len(palette))
+            shown = self._board_neo_color
+            if shown is None or shown[0] is not palette or shown[1] != k:
+                self._board_neo_color = (palette, k)
+                self.board_neo[0] = (palette[k], palette[k+1], palette[k+2])
+
+        low_power = (not is_moving and self.palette is IDLE_PALETTE
+                     and not self.anims.active())
+        if low_power != self.low_power:
+            if DEBUG >= 1: print('low power:', low_power)
+            self.low_power = low_power
+            self.accel.set_low_power(low_power)
+            if self.board_led:
+                self.board_led.value = False
+        prof.lap(PROF_SHOW)
+        self.frames += 1
+        prof.end()
+
+    # Fraction of the time since the last call spent running ticks rather
+    # than sleeping.
+    def duty_cycle(self):
+        total = self.busy_sec + self.sleep_sec
+        duty = self.busy_sec / total if total else 1.0
+        self.busy_sec = self.sleep_sec = 0.0
+        return duty
+
+    # Switches to palette through black. The pattern keeps moving while the
+    # transition plays, so it picks up where it is at the end.
+    def _transition(self, palette, now):
+        old = self.palette
+        self.palette = palette
+        self.last_palette_change_time = now
+        shift = self._shift
+        self.anims.play(IDLE_TRANSITION(
+            self.neos, old, BLACK, shift, IDLE_TRANSITION_SEC))
+        self.anims.queue(IDLE_TRANSITION(
+            self.neos, BLACK, palette, shift, IDLE_TRANSITION_SEC))
+
+    def _shift(self):
+        return self.pos
+
+    # Runs forever if frames is None.
+    def run(self, frames=None):
+        end = None if frames is None else self.frames + frames
+        while end is None or self.frames < end:
+            start = timestamp()
+            self.tick(start)
+            done = timestamp()
+            self.busy_sec += done - start
+            if self.low_power:
+                wait = start + IDLE_FRAME_SEC - done
+                if wait > 0:
+                    time.sleep(wait)
+                    self.sleep_sec += wait
@@ -0,0 +1,122 @@
+# Cooperative animations for short feedback effects and palette transitions.
+#
+# An animation is a generator that draws one frame each time it's resumed and
+# then yields how many seconds that frame should stay up. The Animator resumes
+# the current one at most once per main loop tick, so animations never block
+# button polling or accelerometer sampling.
+
+import random
+
+
+class Animator(object):
+    def __init__(self):
+        self._anims = []
+        self._until = 0
+
+    def active(self):
+        return len(self._anims) > 0
+
+    # Replace whatever is running, so feedback follows the latest input.
+    def play(self, anim):
+        self._anims = [anim]
+        self._until = 0
+
+    # Run after whatever is already queued.
+    def queue(self, anim):
+        self._anims.append(anim)
+
+    def clear(self):
+        self._anims = []
+
+    # Advances the current animation if its frame is due. Returns True while
+    # an animation owns the strip, so the caller should skip its own frame.
+    def step(self, now):
+        while self._anims:
+            if now < self._until:
+                return True
+            try:
+                self._until = now + next(self._anims[0])
+                return True
+            except StopIteration:
+                self._anims.pop(0)
+                self._until = 0
+        return False
+
+
+# Shows colors at each of the given shifts, frame_sec apart.
+def palette_frames(neos, colors, shifts, frame_sec=0):
+    for shift in shifts:
+        neos.set_colors(colors, shift)
+        yield frame_sec
+
+
+# Blanks the strip, then walks colors along it. Used when brightness hits a
+# limit.
+def limit_flash(neos, colors, steps=8, frame_sec=0.05, end_sec=0.1):
+    neos.set_colors((0, 0, 0))
+    yield frame_sec
+    for i in range(steps):
+        neos.set_colors(colors, i)
+        yield end_sec if i == steps - 1 else frame_sec
+
+
+## Transitions from one palette (or single color) to another.
+#
+# Each takes shift, a function returning the current palette shift, so the
+# pattern keeps moving underneath, and draws about duration / frame_sec
+# frames however long the strip is. Frames mixed from two go out through
+# neos.show_mix(), which keeps them within the current budget.
+
+TRANSITION_FRAME_SEC = 0.02
+
+
+def _transition_steps(duration, frame_sec):
+    return max(1, int(duration / frame_sec + 0.5))
+
+
+# Reveals to over frm from the far end of the strip back to the start.
+def wipe(neos, frm, to, shift, duration=0.4, frame_sec=TRANSITION_FRAME_SEC):
+    num = neos.num_leds
+    steps = _transition_steps(duration, frame_sec)
+    for i in range(1, steps + 1):
+        first = num - num * i // steps  # first pixel showing to
+        s = shift()
+        neos.write(neos.frame(frm, s)[:3 * first])
+        neos.write(neos.frame(to, s)[3 * first:], first)
+        neos.show_mix()
+        yield frame_sec
+
+
+# Blends every pixel from frm to to.
+def crossfade(neos, frm, to, shift, duration=0.4,
+              frame_sec=TRANSITION_FRAME_SEC):
+    steps = _transition_steps(duration, frame_sec)
+    for i in range(1, steps + 1):
+        w = 256 * i // steps
+        s = shift()
+        a, b = neos.frame(frm, s), neos.frame(to, s)
+        buf = neos.buf
+        for j in range(len(buf)):
+            buf[j] = (a[j] * (256 - w) + b[j] * w) >> 8
+        neos.show_mix()
+        yield frame_sec
+
+
+# Switches pixels from frm to to one at a time, in random order.
+def dissolve(neos, frm, to, shift, duration=0.4,
+             frame_sec=TRANSITION_FRAME_SEC):
+    num = neos.num_leds
+    order = list(range(num))
+    for i in range(num - 1, 0, -1):
+        j = random.randint(0, i)
+        order[i], order[j] = order[j], order[i]
+    steps = _transition_steps(duration, frame_sec)
+    for i in range(1, steps + 1):
+        s = shift()
+        b = neos.frame(to, s)
+        neos.write(neos.frame(frm, s))
+        for k in range(num * i // steps):
+            p = 3 * order[k]
+            neos.write(b[p:p + 3], order[k])
+        neos.show_mix()
+        yield frame_sec
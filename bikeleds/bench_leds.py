@@ -0,0 +1,118 @@
+"""Time the bike controller's LED rendering on the host (host only).
+
+    python bikeleds/bench_leds.py
+    python bikeleds/bench_leds.py --brightness 1.0 --gamma 2.2
+    python bikeleds/bench_leds.py --sketch --cpu-scale 30
+    python bikeleds/bench_leds.py --sketch /tmp/old/bikeleds/accel_leds.py --cpu-scale 30
+
+For each palette in accel_leds.PALETTES (and the idle one), times the first
+frame drawn, which renders the palette into Neos' frame cache, then frames per
+second drawing and sending it at successive shifts, in strip order and mapped
+through the horizontal layout pattern (see layout.py). Strip writes are
+stubbed out, so this is the renderer alone. The set_rgb row is
+PixelBuffer.set_rgb over a 16x16 panel's pixels, as lightring.py and
+neo_predprey.py draw, at --brightness.
+
+--sketch instead runs a sketch (default bikeleds/code.py) for --frames frames
+through hostsim/run.py and reports its frame rate. hostsim only counts
+modeled strip time, so pass --cpu-scale (how many times slower the board is
+than this machine) for a board-like figure. Any version of the sketch can be
+run this way, e.g. one checked out with `git worktree add`, for before and
+after numbers.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+BIKELEDS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BIKELEDS_DIR), 'hostsim'))
+
+import run
+from sim import SIM
+
+run.install(BIKELEDS_DIR)
+
+import board
+import accel_leds
+import layout
+import pixelbuffer
+
+PALETTE_NAMES = ('PURPLE_BLUE_BLANK', 'ORANGE_PURPLE_BLANK', 'PINK_PURPLE_BLANK',
+                 'BLUE_GREEN_BLANK', 'PURPLE_BLUE', 'ORANGE_PURPLE',
+                 'GREEN_BLUE', 'IDLE_PALETTE')
+LAYOUT_PATH = os.path.join(BIKELEDS_DIR, 'layout.json')
+PANEL_PIXELS = 256
+
+
+# Returns the first frame's time and frames/sec after it, drawing palette
+# with draw(palette, shift).
+def bench_palette(neos, draw, palette, frames):
+    start = time.perf_counter()
+    draw(palette, 0)
+    first = time.perf_counter() - start
+    n = accel_leds.palette_len(palette)
+    start = time.perf_counter()
+    for k in range(1, frames + 1):
+        draw(palette, k % n)
+    return first, frames / (time.perf_counter() - start)
+
+
+def bench_set_rgb(bright, gamma, reps):
+    pixels = pixelbuffer.PixelBuffer(board.D5, PANEL_PIXELS, brightness=bright,
+                                     gamma=gamma)
+    set_rgb = pixels.set_rgb
+    start = time.perf_counter()
+    for _ in range(reps):
+        for i in range(PANEL_PIXELS):
+            set_rgb(i, 200, i & 0xff, 40)
+    return (time.perf_counter() - start) / reps
+
+
+def bench_renderer(args):
+    SIM.reset()
+    SIM.write_strip = lambda name, buf: None
+    runs = layout.index_runs(layout.load_layout(LAYOUT_PATH), layout.horizontal,
+                             0.6, accel_leds.SUBSTEPS)
+    print('{:>20} {:>9} {:>10} {:>10}'.format(
+        'palette', 'first ms', 'fps', 'mapped fps'))
+    for name in PALETTE_NAMES:
+        palette = getattr(accel_leds, name)
+        neos = accel_leds.Neos(board.D12, accel_leds.NLEDS, gamma=args.gamma)
+        neos.brightness = args.brightness
+        first, fps = bench_palette(neos, neos.set_colors, palette, args.frames)
+        neos = accel_leds.Neos(board.D12, accel_leds.NLEDS, gamma=args.gamma)
+        neos.brightness = args.brightness
+        _, mapped_fps = bench_palette(
+            neos, lambda p, s: neos.set_colors_mapped(p, s, runs), palette,
+            args.frames)
+        print('{:>20} {:>9.3f} {:>10.0f} {:>10.0f}'.format(
+            name, first * 1e3, fps, mapped_fps))
+    secs = bench_set_rgb(args.brightness, args.gamma, max(1, args.frames // 100))
+    print('set_rgb x{}: {:.3f}ms'.format(PANEL_PIXELS, secs * 1e3))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--frames', type=int, default=0,
+                        help='frames per palette, or to run --sketch for '
+                             '(default 20000, or 1000)')
+    parser.add_argument('--brightness', type=float, default=accel_leds.BRIGHT_INIT)
+    parser.add_argument('--gamma', type=float, help='e.g. 2.2')
+    parser.add_argument('--sketch', nargs='?', const=os.path.join(BIKELEDS_DIR, 'code.py'),
+                        help='run a sketch instead (default bikeleds/code.py)')
+    parser.add_argument('--cpu-scale', type=float, default=0,
+                        help='with --sketch, count host CPU time times this')
+    args = parser.parse_args()
+    if args.sketch:
+        reason, wall = run.run(args.sketch, frames=args.frames or 1000,
+                               cpu_scale=args.cpu_scale, quiet=True, seed=1)
+        run.report(reason, wall)
+    else:
+        args.frames = args.frames or 20000
+        bench_renderer(args)
+
+
+if __name__ == '__main__':
+    main()
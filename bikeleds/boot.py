@@ -0,0 +1,14 @@
+# Hold the palette button (D11) while the board boots to make the filesystem
+# writable from code, so code.py can record accelerometer traces (see
+# RECORD_ACCEL). The drive is then read-only over USB until the next boot.
+
+import board
+import digitalio
+import storage
+
+button = digitalio.DigitalInOut(board.D11)
+button.direction = digitalio.Direction.INPUT
+button.pull = digitalio.Pull.UP
+if not button.value:
+    storage.remount('/', readonly=False)
+button.deinit()
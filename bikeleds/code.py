@@ -0,0 +1,61 @@
+# Entry point for the bike controller. Copy this and the other modules in
+# bikeleds/ (except the host-only replay_accel.py and bench_leds.py) to the
+# CIRCUITPY drive, e.g.:
+#   bin/cirpy_fswatch.sh bikeleds/accel_leds.py /Volumes/CIRCUITPY/accel_leds.py
+#   bin/cirpy_fswatch.sh bikeleds/code.py
+
+import board
+import simpleio
+
+import accel_leds
+import inputs
+import motion
+
+
+# Log raw accelerometer samples to ACCEL_TRACE_PATH for replay_accel.py. Only
+# works if boot.py made the filesystem writable.
+RECORD_ACCEL = False
+ACCEL_TRACE_PATH = '/accel_trace.bin'
+
+recorder = None
+if RECORD_ACCEL:
+    try:
+        recorder = motion.Recorder(ACCEL_TRACE_PATH)
+    except OSError as e:
+        print('not recording accel:', e)
+
+# Color by position on the bike instead of along the strip: None for strip
+# order, or the name of a pattern in layout.py, with GEOMETRY_ARGS for the
+# ones that take arguments. layout.py (and its JSON parsing) is only imported
+# when one is set. The layout's LED spacing is 1.67cm, so 0.6 entries/cm moves
+# one palette entry per LED along horizontal runs.
+GEOMETRY_PATTERN = None  # e.g. 'horizontal', or 'radial' with GEOMETRY_ARGS
+GEOMETRY_ARGS = ()  # e.g. (cx, cy) in cm for 'radial'
+LAYOUT_PATH = 'layout.json'
+PATTERN_ENTRIES_PER_CM = 0.6
+
+layout_runs = None
+if GEOMETRY_PATTERN:
+    import layout
+    pattern = getattr(layout, GEOMETRY_PATTERN)
+    if GEOMETRY_ARGS:
+        pattern = pattern(*GEOMETRY_ARGS)
+    layout_runs = layout.index_runs(
+        layout.load_layout(LAYOUT_PATH), pattern,
+        PATTERN_ENTRIES_PER_CM, accel_leds.SUBSTEPS)
+
+board_led = simpleio.DigitalOut(board.D13)
+board_led.value = True
+
+board_neo = accel_leds.try_get_board_neo()
+
+engine = accel_leds.Engine(
+    neos=accel_leds.Neos(board.D12, accel_leds.NLEDS),
+    accel=motion.Accel(board.A3, board.A4, board.A5, recorder=recorder),
+    # palette button, then up/down brightness buttons (see accel_leds.*_KEY)
+    buttons=inputs.Buttons([board.D11, board.D10, board.D9],
+                           chords=accel_leds.BUTTON_CHORDS),
+    board_led=board_led,
+    board_neo=board_neo,
+    layout_runs=layout_runs)
+engine.run()
@@ -0,0 +1,144 @@
+# Button events: debounced and timestamped press / release / long-press /
+# chord events, so the main loop reacts to what happened since the last tick
+# instead of what the pins happen to read right now.
+#
+# Where CircuitPython has the `keypad` module, the pins are scanned and
+# debounced in the background at a fixed rate and events queue up until
+# update() drains them, so no press is lost however long a frame takes.
+# Otherwise each update() polls and debounces the pins itself.
+
+try:
+    import keypad
+except ImportError:
+    keypad = None
+    import digitalio
+
+try:
+    import supervisor
+except ImportError:
+    supervisor = None
+
+PRESS = 'press'
+RELEASE = 'release'
+LONG_PRESS = 'long'
+CHORD = 'chord'
+
+SCAN_INTERVAL = 0.02  # keypad scan period, which also debounces
+DEBOUNCE_SEC = 0.02  # fallback polling: state must hold this long to count
+LONG_PRESS_SEC = 0.8
+# Keys that are part of a chord hold back their own PRESS this long, in case
+# the rest of the chord follows.
+CHORD_SEC = 0.1
+
+_TICKS_PERIOD = 1 << 29  # supervisor.ticks_ms() wraps here
+
+
+class _PolledKey(object):
+    def __init__(self, pin):
+        self._dio = digitalio.DigitalInOut(pin)
+        self._dio.direction = digitalio.Direction.INPUT
+        self._dio.pull = digitalio.Pull.UP
+        self.pressed = not self._dio.value
+        self._raw = self.pressed
+        self._raw_since = 0
+
+    # Returns the time of the edge if the debounced state just changed.
+    def poll(self, now):
+        raw = not self._dio.value
+        if raw != self._raw:
+            self._raw = raw
+            self._raw_since = now
+        elif raw != self.pressed and now - self._raw_since >= DEBOUNCE_SEC:
+            self.pressed = raw
+            return self._raw_since
+        return None
+
+
+class Buttons(object):
+    # pins are active-low buttons; events refer to them by index. chords is a
+    # list of key index tuples, reported as one CHORD event (with the chord's
+    # index) when all of its keys go down within CHORD_SEC.
+    def __init__(self, pins, chords=()):
+        n = len(pins)
+        self._chords = chords
+        self._in_chord = [any(k in chord for chord in chords) for k in range(n)]
+        self._down = [False] * n
+        self._down_time = [0] * n
+        self._pending = [None] * n  # held-back press time, for chord keys
+        self._quiet = [False] * n  # no more events until release
+        self._events = []
+        if keypad:
+            self._keys = keypad.Keys(pins, value_when_pressed=False, pull=True,
+                                     interval=SCAN_INTERVAL)
+            self._event = keypad.Event()
+        else:
+            self._keys = [_PolledKey(pin) for pin in pins]
+
+    def is_down(self, key):
+        return self._down[key]
+
+    # Returns the events since the last call as (kind, index, time) tuples,
+    # oldest first. The list is reused, so don't hold on to it.
+    def update(self, now):
+        events = self._events
+        del events[:]
+        if keypad:
+            event = self._event
+            while self._keys.events.get_into(event):
+                t = self._event_time(event, now)
+                if event.pressed:
+                    self._on_press(event.key_number, t)
+                else:
+                    self._on_release(event.key_number, t)
+        else:
+            for (k, key) in enumerate(self._keys):
+                t = key.poll(now)
+                if t is None:
+                    continue
+                if key.pressed:
+                    self._on_press(k, t)
+                else:
+                    self._on_release(k, t)
+
+        for k in range(len(self._down)):
+            pending = self._pending[k]
+            if pending is not None and now - pending >= CHORD_SEC:
+                self._pending[k] = None
+                events.append((PRESS, k, pending))
+            elif (self._down[k] and pending is None and not self._quiet[k]
+                  and now - self._down_time[k] >= LONG_PRESS_SEC):
+                self._quiet[k] = True
+                events.append((LONG_PRESS, k, now))
+        return events
+
+    # keypad timestamps are in supervisor.ticks_ms(), not time.monotonic().
+    def _event_time(self, event, now):
+        stamp = getattr(event, 'timestamp', None)
+        if stamp is None or supervisor is None:
+            return now
+        age = (supervisor.ticks_ms() - stamp) % _TICKS_PERIOD
+        return now - age / 1000
+
+    def _on_press(self, k, t):
+        self._down[k] = True
+        self._down_time[k] = t
+        self._quiet[k] = False
+        if not self._in_chord[k]:
+            self._events.append((PRESS, k, t))
+            return
+        self._pending[k] = t
+        for (c, chord) in enumerate(self._chords):
+            if k in chord and all(self._pending[j] is not None for j in chord):
+                for j in chord:
+                    self._pending[j] = None
+                    self._quiet[j] = True
+                self._events.append((CHORD, c, t))
+                return
+
+    def _on_release(self, k, t):
+        self._down[k] = False
+        if self._pending[k] is not None:
+            # Released before the chord window closed: still a plain press.
+            self._events.append((PRESS, k, self._pending[k]))
+            self._pending[k] = None
+        self._events.append((RELEASE, k, t))
@@ -0,0 +1,62 @@
+# Where the LEDs sit on the bike, and patterns that follow that geometry
+# instead of strip order.
+#
+# A layout is a JSON file (see layout.json) with either a list of per-LED
+# "points", [x, y] in cm, or a list of straight "segments" of evenly spaced
+# LEDs, {"from": [x, y], "to": [x, y], "leds": n}, in strip order.
+#
+# A pattern maps an LED's (x, y) to a palette position. That's evaluated once
+# at startup into an index table, compressed into runs of LEDs that show
+# consecutive palette entries, so each frame is one slice copy per run (see
+# Neos.set_colors_mapped) and time only enters through the palette shift.
+
+import json
+import math
+
+
+def load_layout(path):
+    with open(path) as f:
+        data = json.load(f)
+    if 'points' in data:
+        return [(p[0], p[1]) for p in data['points']]
+    points = []
+    for seg in data['segments']:
+        (x1, y1), (x2, y2), n = seg['from'], seg['to'], seg['leds']
+        for i in range(n):
+            frac = i / (n - 1) if n > 1 else 0
+            points.append((x1 + (x2 - x1) * frac, y1 + (y2 - y1) * frac))
+    return points
+
+
+## Patterns: (x, y) -> distance along the pattern, in cm.
+
+def horizontal(x, y):
+    return x
+
+
+def vertical(x, y):
+    return y
+
+
+# Rings spreading out from a point, e.g. the bottom bracket.
+def radial(cx, cy):
+    def pattern(x, y):
+        return math.sqrt((x - cx) ** 2 + (y - cy) ** 2)
+    return pattern
+
+
+# Index table for a pattern over a layout, as (first_led, count, index) runs.
+# index is in palette sub-steps (1/substeps of an entry): LED first_led + k
+# shows palette position index + k * substeps, plus the current shift.
+# entries_per_cm sets how stretched the palette is over the bike.
+def index_runs(points, pattern, entries_per_cm, substeps):
+    runs = []
+    for (led, (x, y)) in enumerate(points):
+        index = int(round(pattern(x, y) * entries_per_cm * substeps))
+        if runs:
+            first, count, start = runs[-1]
+            if first + count == led and start + count * substeps == index:
+                runs[-1] = (first, count + 1, start)
+                continue
+        runs.append((led, 1, index))
+    return runs
@@ -0,0 +1,239 @@
+# Motion detection from an analog 3-axis accelerometer (one AnalogIn per
+# axis, ADXL335-style).
+#
+# Samples are taken at a fixed SAMPLE_HZ whatever the frame rate, each one the
+# average of OVERSAMPLE back-to-back ADC reads per axis, and stored in an
+# array-backed ring. A slow low-pass filter tracks gravity; what's left after
+# subtracting it is motion, whose energy (g^2) is averaged over the ring. A
+# small state machine with separate move / idle thresholds turns that into
+# moving vs. idle. Nothing here allocates per sample.
+#
+# In low-power mode (set_low_power) samples are taken at WAKE_SAMPLE_HZ and
+# any single sample over MOVE_THRESH counts as moving, so waking up doesn't
+# wait for the slower ring average.
+#
+# A Recorder can log every raw sample to a file, for tuning the detector
+# offline with replay_accel.py.
+
+import array
+import math
+import struct
+import time
+
+import analogio
+
+DEBUG = 0
+
+SAMPLE_HZ = 50
+SAMPLE_PERIOD = 1 / SAMPLE_HZ
+# Rate while in low-power mode, only watching for motion to wake up on.
+WAKE_SAMPLE_HZ = 10
+OVERSAMPLE = 4
+RING_LEN = 16  # samples in the ring and the motion average (~0.3s)
+GRAVITY_ALPHA = 0.02  # low-pass weight of each sample in the gravity estimate
+
+IDLE = 0
+MOVING = 1
+
+# Trace files: RECORD_MAGIC, SAMPLE_HZ as '<H', then one RECORD_FORMAT
+# record per sample: ms since the first sample and raw x, y, z. Samples taken
+# in low-power mode, at WAKE_SAMPLE_HZ instead, store -1 - ms (a flag bit
+# would make it a long int on the board).
+RECORD_MAGIC = b'ACC1'
+RECORD_FORMAT = '<iHHH'
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+
+
+def timestamp():
+    return time.monotonic()
+
+
+# Converts a 16-bit AnalogIn reading to gravities.
+def raw_to_g(raw):
+    return (raw / 65536 - 0.5) * 3.0
+
+
+class Accel(object):
+    MOVE_THRESH = 0.01  # g^2 of motion energy to count as moving
+    IDLE_THRESH = 0.004  # below this for IDLE_DELAY seconds to go idle
+    IDLE_DELAY = 10
+
+    # The pins may instead be any objects with a .value, like AnalogIn's
+    # (replay_accel.py feeds recorded samples in that way).
+    def __init__(self, pin_x, pin_y, pin_z, recorder=None):
+        self._axes = tuple(p if hasattr(p, 'value') else analogio.AnalogIn(p)
+                           for p in (pin_x, pin_y, pin_z))
+        self.recorder = recorder
+        self.raw = array.array('H', [0] * (3 * RING_LEN))  # x,y,z per sample
+        self.energy = array.array('f', [0.0] * RING_LEN)
+        self.gravity = array.array('f', [0.0, 0.0, 0.0])
+        self._energy_sum = 0.0
+        self._ring_i = 0
+        self._next_sample = None
+        self._period = SAMPLE_PERIOD
+        self._low_power = False
+        self._last_move = None
+        self.motion = 0.0  # mean motion energy over the ring, g^2
+        self.state = MOVING
+        self.samples = 0
+        self.missed = 0  # samples skipped because update() was called late
+
+    # Takes a sample if one is due. If the caller fell more than a sample
+    # period behind, the missed samples are counted but not made up.
+    def update(self, now):
+        if self._next_sample is None:
+            self._next_sample = now
+        if now < self._next_sample:
+            return
+        late = int((now - self._next_sample) / self._period)
+        self.missed += late
+        self._next_sample += (late + 1) * self._period
+        self.sample(now)
+
+    # Takes a sample now, off the schedule: replay_accel.py feeds recorded
+    # samples in at their recorded times this way.
+    def sample(self, now):
+        if self._last_move is None:
+            self._last_move = now
+        self._sample()
+        if self.recorder:
+            j = 3 * ((self._ring_i - 1) % RING_LEN)
+            self.recorder.add(now, self.raw[j], self.raw[j + 1], self.raw[j + 2],
+                              self._low_power)
+        self._update_state(now)
+
+    def _sample(self):
+        axes, raw, gravity = self._axes, self.raw, self.gravity
+        i = self._ring_i
+        energy = 0.0
+        for a in range(3):
+            axis = axes[a]
+            total = 0
+            for _ in range(OVERSAMPLE):
+                total += axis.value
+            total //= OVERSAMPLE
+            raw[3 * i + a] = total
+            val = raw_to_g(total)
+            if self.samples == 0:
+                gravity[a] = val
+            else:
+                gravity[a] += GRAVITY_ALPHA * (val - gravity[a])
+            d = val - gravity[a]
+            energy += d * d
+        self._energy_sum += energy - self.energy[i]
+        self.energy[i] = energy
+        i += 1
+        if i == RING_LEN:
+            i = 0
+            # Resum once per lap so float error can't build up.
+            self._energy_sum = sum(self.energy)
+        self._ring_i = i
+        self.motion = self._energy_sum / RING_LEN
+        self.samples += 1
+
+    def set_low_power(self, low_power):
+        self._low_power = low_power
+        self._period = 1 / WAKE_SAMPLE_HZ if low_power else SAMPLE_PERIOD
+
+    def _update_state(self, now):
+        motion = self.motion
+        if self._low_power:
+            # Latest sample alone.
+            motion = self.energy[(self._ring_i - 1) % RING_LEN]
+        if motion > self.MOVE_THRESH:
+            self._last_move = now
+            if self.state != MOVING and DEBUG >= 1: print('accel: moving')
+            self.state = MOVING
+        elif motion >= self.IDLE_THRESH:
+            # Between thresholds: not idle yet, but not enough to wake up.
+            self._last_move = now
+        elif self.state == MOVING and now - self._last_move >= self.IDLE_DELAY:
+            if DEBUG >= 1: print('accel: idle')
+            self.state = IDLE
+        if DEBUG >= 2:
+            print('acc: {}\t[ motion:{:.4f}\t g:({:.2f},{:.2f},{:.2f})\t idle:{:.1f} ]'.format(
+                self.state, motion, self.gravity[0], self.gravity[1],
+                self.gravity[2], now - self._last_move))
+
+    def is_moving(self, now=None):
+        self.update(timestamp() if now is None else now)
+        return self.state == MOVING
+
+    # (pitch, roll) in degrees, from the current gravity estimate.
+    def tilt(self):
+        x, y, z = self.gravity
+        pitch = math.atan2(x, math.sqrt(y * y + z * z))
+        roll = math.atan2(y, z)
+        return pitch * 180 / math.pi, roll * 180 / math.pi
+
+    # Most recent raw (x, y, z) sample.
+    def last_raw(self):
+        j = 3 * ((self._ring_i - 1) % RING_LEN)
+        return self.raw[j], self.raw[j + 1], self.raw[j + 2]
+
+
+# Appends raw samples to a trace file. Writes go out in chunks, since flash
+# writes are slow, and stop once the file reaches max_bytes.
+#
+# CircuitPython's filesystem is read-only to code unless boot.py remounts it,
+# in which case open() works here (and the drive is read-only over USB).
+class Recorder(object):
+    def __init__(self, path, max_bytes=256 * 1024, chunk_records=64):
+        self._file = open(path, 'wb')
+        self._file.write(RECORD_MAGIC)
+        self._file.write(struct.pack('<H', SAMPLE_HZ))
+        self._chunk = bytearray(RECORD_SIZE * chunk_records)
+        self._chunk_records = chunk_records
+        self._n = 0
+        self._t0 = None
+        self.bytes_written = len(RECORD_MAGIC) + 2
+        self.max_bytes = max_bytes
+
+    def add(self, now, x, y, z, low_power=False):
+        if self._file is None:
+            return
+        if self._t0 is None:
+            self._t0 = now
+        ms = int((now - self._t0) * 1000)
+        if low_power:
+            ms = -1 - ms
+        struct.pack_into(RECORD_FORMAT, self._chunk, RECORD_SIZE * self._n,
+                         ms, x, y, z)
+        self._n += 1
+        if self._n == self._chunk_records:
+            self.flush()
+
+    def flush(self):
+        if self._file is None or not self._n:
+            return
+        self._file.write(memoryview(self._chunk)[:RECORD_SIZE * self._n])
+        self._file.flush()
+        self.bytes_written += RECORD_SIZE * self._n
+        self._n = 0
+        if self.bytes_written >= self.max_bytes:
+            if DEBUG >= 1: print('recorder: full at', self.bytes_written)
+            self._file.close()
+            self._file = None
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# Returns (sample_hz, records) for a trace file, records being
+# (seconds, x, y, z, low_power) tuples. For the host side; this allocates
+# freely.
+def read_trace(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:len(RECORD_MAGIC)] != RECORD_MAGIC:
+        raise ValueError('{}: not an accel trace'.format(path))
+    header = len(RECORD_MAGIC) + 2
+    sample_hz, = struct.unpack('<H', data[len(RECORD_MAGIC):header])
+    records = []
+    for off in range(header, len(data) - RECORD_SIZE + 1, RECORD_SIZE):
+        ms, x, y, z = struct.unpack_from(RECORD_FORMAT, data, off)
+        records.append((max(ms, -1 - ms) / 1000, x, y, z, ms < 0))
+    return sample_hz, records
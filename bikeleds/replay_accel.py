@@ -0,0 +1,226 @@
+"""Replay recorded accelerometer traces through the motion detectors (host only).
+
+    python bikeleds/replay_accel.py ride.bin --truth 62:idle --truth 118:moving
+    python bikeleds/replay_accel.py ride.bin --idle-thresh 0.002 --idle-delay 6
+    python bikeleds/replay_accel.py --synth synth.bin
+
+Traces are written on the board by motion.Recorder (see RECORD_ACCEL in
+code.py). Each detector is fed every sample as fast as it can take them, at
+its recorded time, and its moving/idle transitions are reported; samples the
+board took in low-power mode go through the pipeline in low-power mode too.
+Given the true transition times (--truth SECONDS:idle|moving, as many as
+needed), it also reports how long each detector took to follow them, how many
+transitions it made that weren't there, and how long it showed idle while the
+bike was really moving.
+"""
+
+import argparse
+import os
+import random
+import struct
+import sys
+import time
+
+# motion imports analogio, so borrow hostsim's.
+BIKELEDS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BIKELEDS_DIR), 'hostsim'))
+
+import motion
+
+STATE_NAMES = {motion.IDLE: 'idle', motion.MOVING: 'moving'}
+
+
+class ReplayAxis(object):
+    def __init__(self):
+        self.value = 0
+
+
+# Feeds samples to motion.Accel through stand-in axes, each one taken as it
+# arrives rather than on Accel's own schedule, which would drop samples whose
+# ms timestamps round a little early.
+class PipelineDetector(object):
+    name = 'pipeline'
+
+    def __init__(self, move_thresh=None, idle_thresh=None, idle_delay=None):
+        self._axes = (ReplayAxis(), ReplayAxis(), ReplayAxis())
+        self.accel = motion.Accel(*self._axes)
+        self._low_power = False
+        if move_thresh is not None: self.accel.MOVE_THRESH = move_thresh
+        if idle_thresh is not None: self.accel.IDLE_THRESH = idle_thresh
+        if idle_delay is not None: self.accel.IDLE_DELAY = idle_delay
+
+    def feed(self, t, x, y, z, low_power=False):
+        axes = self._axes
+        axes[0].value, axes[1].value, axes[2].value = x, y, z
+        if low_power != self._low_power:
+            self._low_power = low_power
+            self.accel.set_low_power(low_power)
+        self.accel.sample(t)
+        return self.accel.state
+
+
+# The detector accel_leds used before motion.Accel: an EWMA of the squared
+# change between consecutive reads over the time between them. It was run
+# once per frame, so its behavior at the trace's sample rate isn't what it
+# was on the bike; it's here as a baseline.
+class LegacyDetector(object):
+    name = 'legacy'
+    EWMA_WEIGHT = 0.2
+    SIZABLE_MOVE_THRESH = 0.08
+    IDLE_DELAY = 10
+
+    def __init__(self, idle_delay=None, **_unused):
+        if idle_delay is not None: self.IDLE_DELAY = idle_delay
+        self._prev = None
+        self._ewma = 0
+        self._last_move = None
+
+    def feed(self, t, x, y, z, low_power=False):
+        read = (motion.raw_to_g(x), motion.raw_to_g(y), motion.raw_to_g(z))
+        if self._prev is None:
+            self._prev, self._prev_t, self._last_move = read, t, t
+            return motion.MOVING
+        dt = t - self._prev_t
+        if dt > 0:
+            daccel = sum((a - b) ** 2 for (a, b) in zip(read, self._prev))
+            self._ewma = (self.EWMA_WEIGHT * daccel / dt
+                          + (1 - self.EWMA_WEIGHT) * self._ewma)
+        self._prev, self._prev_t = read, t
+        if self._ewma > self.SIZABLE_MOVE_THRESH:
+            self._last_move = t
+        return (motion.MOVING if t - self._last_move < self.IDLE_DELAY
+                else motion.IDLE)
+
+
+DETECTORS = {d.name: d for d in [PipelineDetector, LegacyDetector]}
+
+
+def replay(detector, records):
+    transitions = []
+    state = motion.MOVING
+    start = time.perf_counter()
+    for (t, x, y, z, low_power) in records:
+        new_state = detector.feed(t, x, y, z, low_power)
+        if new_state != state:
+            state = new_state
+            transitions.append((t, state))
+    return transitions, time.perf_counter() - start
+
+
+# Matches each true transition with the detector's first transition to the
+# same state before the next true one.
+def score(transitions, truth, end):
+    latencies = []
+    matched = set()
+    for (k, (t, state)) in enumerate(truth):
+        until = truth[k + 1][0] if k + 1 < len(truth) else end
+        hit = None
+        for (i, (dt, dstate)) in enumerate(transitions):
+            if t <= dt < until and dstate == state and i not in matched:
+                hit = i
+                break
+        if hit is None:
+            latencies.append(None)
+        else:
+            matched.add(hit)
+            latencies.append(transitions[hit][0] - t)
+    false_transitions = len(transitions) - len(matched)
+    return latencies, false_transitions, false_idle_secs(transitions, truth, end)
+
+
+def false_idle_secs(transitions, truth, end):
+    def state_at(changes, t):
+        state = motion.MOVING
+        for (ct, cstate) in changes:
+            if ct > t:
+                break
+            state = cstate
+        return state
+    times = sorted(set([0.0, end] + [t for (t, _) in transitions + truth]))
+    total = 0.0
+    for (a, b) in zip(times, times[1:]):
+        if (state_at(transitions, a) == motion.IDLE
+                and state_at(truth, a) == motion.MOVING):
+            total += b - a
+    return total
+
+
+# A ride, a long stop, more riding, a red light, and a final ride. Vibration
+# on every axis while riding, ADC noise only while stopped, and gravity on z.
+def write_synth(path, seconds=240, sample_hz=motion.SAMPLE_HZ, seed=1):
+    stops = [(60, 120), (180, 185)]
+    rng = random.Random(seed)
+    g_counts = 65536 / 3.0
+    with open(path, 'wb') as f:
+        f.write(motion.RECORD_MAGIC)
+        f.write(struct.pack('<H', sample_hz))
+        for i in range(int(seconds * sample_hz)):
+            t = i / sample_hz
+            riding = not any(a <= t < b for (a, b) in stops)
+            sigma = 0.15 * g_counts if riding else 25
+            xyz = [32768 + rng.gauss(0, sigma), 32768 + rng.gauss(0, sigma),
+                   32768 + g_counts + rng.gauss(0, sigma)]
+            xyz = [max(0, min(65535, int(v))) for v in xyz]
+            f.write(struct.pack(motion.RECORD_FORMAT, int(t * 1000), *xyz))
+    truth = []
+    for (a, b) in stops:
+        truth += ['{}:idle'.format(a), '{}:moving'.format(b)]
+    print('wrote {} ({}s at {}Hz); truth: {}'.format(
+        path, seconds, sample_hz, ' '.join('--truth ' + x for x in truth)))
+
+
+def parse_truth(specs):
+    truth = []
+    for spec in specs:
+        t, name = spec.split(':')
+        state = {'idle': motion.IDLE, 'moving': motion.MOVING}[name]
+        truth.append((float(t), state))
+    return sorted(truth)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('trace', nargs='?')
+    parser.add_argument('--synth', metavar='PATH',
+                        help='write a synthetic trace to PATH and exit')
+    parser.add_argument('--detector', choices=sorted(DETECTORS), action='append',
+                        help='detectors to run (default: all)')
+    parser.add_argument('--truth', action='append', default=[],
+                        metavar='SECONDS:STATE')
+    parser.add_argument('--move-thresh', type=float)
+    parser.add_argument('--idle-thresh', type=float)
+    parser.add_argument('--idle-delay', type=float)
+    args = parser.parse_args()
+
+    if args.synth:
+        write_synth(args.synth)
+        return
+    if not args.trace:
+        parser.error('need a trace file')
+
+    sample_hz, records = motion.read_trace(args.trace)
+    end = records[-1][0] if records else 0.0
+    truth = parse_truth(args.truth)
+    print('{}: {} samples, {:.1f}s at {}Hz'.format(
+        args.trace, len(records), end, sample_hz))
+    for name in args.detector or sorted(DETECTORS):
+        detector = DETECTORS[name](move_thresh=args.move_thresh,
+                                   idle_thresh=args.idle_thresh,
+                                   idle_delay=args.idle_delay)
+        transitions, wall = replay(detector, records)
+        print('\n{}: {:.0f} samples/s, {:.0f}x real time'.format(
+            name, len(records) / wall, end / wall if wall else 0))
+        for (t, state) in transitions:
+            print('  {:8.2f}s  {}'.format(t, STATE_NAMES[state]))
+        if truth:
+            latencies, false_count, false_idle = score(transitions, truth, end)
+            for ((t, state), lat) in zip(truth, latencies):
+                print('  truth {:8.2f}s {:6s}  latency: {}'.format(
+                    t, STATE_NAMES[state],
+                    'missed' if lat is None else '{:.2f}s'.format(lat)))
+            print('  false transitions: {}  false idle: {:.2f}s'.format(
+                false_count, false_idle))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,22 @@
+# Simulated `analogio`. AnalogIn reads the scripted signal for its pin, or
+# mid-scale if the pin has no script.
+
+from sim import SIM, ANALOG_READ_SEC, ANALOG_MID
+
+
+class AnalogIn(object):
+    reference_voltage = 3.3
+
+    def __init__(self, pin):
+        self.pin = pin
+
+    @property
+    def value(self):
+        SIM.clock.advance(ANALOG_READ_SEC)
+        signal = SIM.analog.get(self.pin.name)
+        if signal is None:
+            return ANALOG_MID
+        return int(signal.value_at(SIM.clock.now))
+
+    def deinit(self):
+        pass
@@ -0,0 +1,21 @@
+# Simulated `board` module. Pins are named after the Metro/Feather M0 boards
+# these sketches were written for; anything else raises AttributeError, the
+# same as on a board without that pin.
+
+
+class Pin(object):
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return 'board.{}'.format(self.name)
+
+
+_PIN_NAMES = (['D{}'.format(i) for i in range(14)]
+              + ['A{}'.format(i) for i in range(6)]
+              + ['NEOPIXEL', 'SCK', 'MOSI', 'MISO', 'SDA', 'SCL', 'TX', 'RX'])
+
+for _name in _PIN_NAMES:
+    globals()[_name] = Pin(_name)
+
+LED = globals()['D13']
@@ -0,0 +1,62 @@
+# Simulated `digitalio`. Inputs read the scripted signal for their pin, or the
+# pull resistor's level if the pin has no script.
+
+from sim import SIM, DIGITAL_READ_SEC
+
+
+class Direction(object):
+    INPUT = 'INPUT'
+    OUTPUT = 'OUTPUT'
+
+
+class Pull(object):
+    UP = 'UP'
+    DOWN = 'DOWN'
+
+
+class DriveMode(object):
+    PUSH_PULL = 'PUSH_PULL'
+    OPEN_DRAIN = 'OPEN_DRAIN'
+
+
+class DigitalInOut(object):
+    def __init__(self, pin):
+        self.pin = pin
+        self.direction = Direction.INPUT
+        self.pull = None
+        self.drive_mode = DriveMode.PUSH_PULL
+        self._out_value = False
+
+    def switch_to_output(self, value=False, drive_mode=DriveMode.PUSH_PULL):
+        self.direction = Direction.OUTPUT
+        self.drive_mode = drive_mode
+        self._out_value = value
+
+    def switch_to_input(self, pull=None):
+        self.direction = Direction.INPUT
+        self.pull = pull
+
+    @property
+    def value(self):
+        if self.direction == Direction.OUTPUT:
+            return self._out_value
+        SIM.clock.advance(DIGITAL_READ_SEC)
+        signal = SIM.digital.get(self.pin.name)
+        if signal is not None:
+            val = signal.value_at(SIM.clock.now)
+            if val is not None:
+                return bool(val)
+        return self.pull == Pull.UP
+
+    @value.setter
+    def value(self, val):
+        self._out_value = bool(val)
+
+    def deinit(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.deinit()
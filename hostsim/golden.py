@@ -0,0 +1,220 @@
+"""Check sketches and simulations against recorded golden traces (host only).
+
+    python hostsim/golden.py
+    python hostsim/golden.py neo_predprey predprey_lib
+    python hostsim/golden.py --update predprey_lib
+    python hostsim/golden.py predprey_batch
+
+Each case runs with a fixed seed and hashes every frame it puts out: the
+bytes written to each strip for sketches (run as run.py would, the random
+module seeded), or the cell arrays after each step for predprey_lib.World,
+which uses a seeded lib/rng.py Rng and so replays the same way anywhere.
+The running hash is kept every CHECK_EVERY frames and compared with
+golden.json, so a mismatch says roughly where the run first went
+different. A change that means to alter a case's output re-records it with
+--update; a speedup shouldn't need to.
+
+Sketches' output also depends on hostsim's modeled timings, so changing
+those (sim.py) changes theirs too.
+
+Checks that aren't traces run after the cases, and fail the same way:
+bikeleds_alloc runs bikeleds/code.py as run.py --alloc would, failing if
+its heap grows per frame after the warm-up. predprey_batch runs a
+fixed-seed sweep_predprey.py --check, comparing predprey_batch.BatchWorld's
+populations with predprey_lib.World's. It needs numpy, and is skipped
+without it.
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+
+import run
+
+REPO_DIR = os.path.dirname(run.HOSTSIM_DIR)
+GOLDEN_PATH = os.path.join(run.HOSTSIM_DIR, 'golden.json')
+CHECK_EVERY = 250
+# sweep_predprey.py arguments for the predprey_batch check. Seeded, so it
+# passes or fails the same way every run.
+BATCH_CHECK_ARGS = ['--check', '--worlds', '200', '--steps', '300', '--seed', '1']
+
+
+class Trace(object):
+    def __init__(self):
+        self.sha = hashlib.sha1()
+        self.count = 0
+        self.checks = []  # the running hash every CHECK_EVERY frames, then at the end
+
+    def add(self, data):
+        self.sha.update(data)
+        self.count += 1
+        if self.count % CHECK_EVERY == 0:
+            self.checks.append(self.sha.hexdigest()[:16])
+
+    def result(self):
+        checks = list(self.checks)
+        if self.count % CHECK_EVERY:
+            checks.append(self.sha.hexdigest()[:16])
+        return {'frames': self.count, 'checks': checks}
+
+
+# Traces by strip name of a sketch's first frames frames.
+def sketch_traces(path, seed, frames):
+    traces = {}
+
+    def on_frame(log):
+        if log.name not in traces:
+            traces[log.name] = Trace()
+        traces[log.name].add(log.frames[-1][1])
+    run.run(os.path.join(REPO_DIR, path), frames=frames, quiet=True,
+            seed=seed, on_frame=on_frame)
+    return traces
+
+
+# The trace of a predprey_lib.World's cells over steps steps, starting over
+# when a step changes nothing, like neo_predprey.py.
+def world_traces(size, wrap, seed, steps):
+    run.install(os.path.join(REPO_DIR, 'predatorprey'))
+    import predprey_lib
+    import rng
+    world = predprey_lib.World(size, size, wrap, rng=rng.Rng(seed))
+    trace = Trace()
+    for _ in range(steps):
+        changed = world.step()
+        world.frame += 1
+        trace.add(bytes(world.type) + world.birth.tobytes()
+                  + world.last_breed.tobytes() + world.last_feed.tobytes())
+        if not changed:
+            world.reset_grid()
+    return {'world': trace}
+
+
+CASES = {
+    'neo_predprey': lambda: sketch_traces('predatorprey/neo_predprey.py', 1, 2000),
+    'lightring': lambda: sketch_traces('lightring/lightring.py', 1, 1000),
+    'bikeleds': lambda: sketch_traces('bikeleds/code.py', 1, 1000),
+    'predprey_lib': lambda: world_traces(16, False, 1, 2000),
+    'predprey_lib_wrap': lambda: world_traces(48, True, 1, 300),
+}
+
+
+# Compares BatchWorld with World, returning what differs or None. Raises
+# ImportError without numpy.
+def batch_check():
+    run.install(os.path.join(REPO_DIR, 'predatorprey'))
+    import sweep_predprey
+    args = sweep_predprey.make_parser().parse_args(BATCH_CHECK_ARGS)
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        ok = sweep_predprey.check(args)
+    if ok:
+        return None
+    return 'World and BatchWorld differ (<-- marks it):\n' + out.getvalue()
+
+
+# Runs a sketch under run.py's --alloc (default warm-up and limit),
+# returning its report if the heap grows or None.
+def alloc_check(sketch, frames):
+    path = os.path.join(REPO_DIR, sketch)
+    alloc = run.AllocTracker(path)
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        run.run(path, frames=frames, quiet=True, alloc=alloc, seed=1)
+        ok = alloc.report()
+    if ok:
+        return None
+    return 'heap grows:\n' + out.getvalue()
+
+
+CHECKS = {
+    'bikeleds_alloc': lambda: alloc_check('bikeleds/code.py', 3000),
+    'predprey_batch': batch_check,
+}
+
+
+# What differs between a recorded case and a new run of it, or None.
+def compare(golden, traces):
+    problems = []
+    for name in sorted(set(golden) | set(traces)):
+        if name not in traces:
+            problems.append('{}: no frames'.format(name))
+            continue
+        if name not in golden:
+            problems.append('{}: not in the golden trace'.format(name))
+            continue
+        want, got = golden[name], traces[name]
+        for (k, (a, b)) in enumerate(zip(want['checks'], got['checks'])):
+            if a != b:
+                problems.append('{}: differs within frames {}-{}'.format(
+                    name, k * CHECK_EVERY + 1, min((k + 1) * CHECK_EVERY, got['frames'])))
+                break
+        else:
+            if want['frames'] != got['frames']:
+                problems.append('{}: {} frames, not {}'.format(
+                    name, got['frames'], want['frames']))
+    return '; '.join(problems) or None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('cases', nargs='*', metavar='CASE',
+                        help='cases and checks to run (default all): {}'.format(
+                            ', '.join(list(CASES) + list(CHECKS))))
+    parser.add_argument('--update', action='store_true',
+                        help='record the cases\' traces instead of checking them')
+    args = parser.parse_args()
+    unknown = [c for c in args.cases if c not in CASES and c not in CHECKS]
+    if unknown:
+        parser.error('unknown cases: {}'.format(', '.join(unknown)))
+
+    golden = {}
+    if os.path.exists(GOLDEN_PATH):
+        with open(GOLDEN_PATH) as f:
+            golden = json.load(f)
+    ok = True
+    for name in [c for c in args.cases or CASES if c in CASES]:
+        # Each case imports its sketch's modules afresh, so module state
+        # left by an earlier case can't change it.
+        modules = set(sys.modules)
+        start = time.perf_counter()
+        traces = {k: t.result() for (k, t) in CASES[name]().items()}
+        secs = time.perf_counter() - start
+        for module in set(sys.modules) - modules:
+            del sys.modules[module]
+        if args.update:
+            golden[name] = traces
+            print('recorded {} ({:.1f}s)'.format(name, secs))
+            continue
+        if name not in golden:
+            problem = 'not recorded, see --update'
+        else:
+            problem = compare(golden[name], traces)
+        ok &= problem is None
+        print('{} {} ({:.1f}s){}'.format('ok      ' if problem is None else 'MISMATCH',
+                                         name, secs, ': ' + problem if problem else ''))
+    if args.update:
+        with open(GOLDEN_PATH, 'w') as f:
+            json.dump(golden, f, indent=1, sort_keys=True)
+            f.write('\n')
+    else:
+        for name in [c for c in args.cases or CHECKS if c in CHECKS]:
+            start = time.perf_counter()
+            try:
+                problem = CHECKS[name]()
+            except ImportError as e:
+                print('skipped  {}: {}'.format(name, e))
+                continue
+            secs = time.perf_counter() - start
+            ok &= problem is None
+            print('{} {} ({:.1f}s){}'.format('ok      ' if problem is None else 'MISMATCH',
+                                             name, secs, ': ' + problem if problem else ''))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
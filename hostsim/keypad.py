@@ -0,0 +1,101 @@
+# Simulated `keypad`. On the board, Keys scans its pins in the background
+# every `interval` seconds; here the scans that would have happened since the
+# last look are replayed against the pins' scripted signals whenever the
+# event queue is read, with timestamps from the virtual clock.
+
+import digitalio
+import supervisor
+from sim import SIM
+
+
+class Event(object):
+    def __init__(self, key_number=0, pressed=True):
+        self.key_number = key_number
+        self.pressed = pressed
+        self.timestamp = 0
+
+    @property
+    def released(self):
+        return not self.pressed
+
+
+class EventQueue(object):
+    def __init__(self, keys, max_events):
+        self._keys = keys
+        self._max_events = max_events
+        self._queue = []  # (key_number, pressed, timestamp)
+        self.overflowed = False
+
+    def _put(self, key_number, pressed, timestamp):
+        if len(self._queue) >= self._max_events:
+            self.overflowed = True
+            return
+        self._queue.append((key_number, pressed, timestamp))
+
+    def get(self):
+        event = Event()
+        return event if self.get_into(event) else None
+
+    def get_into(self, event):
+        self._keys._scan()
+        if not self._queue:
+            return False
+        event.key_number, event.pressed, event.timestamp = self._queue.pop(0)
+        return True
+
+    def clear(self):
+        self._queue = []
+        self.overflowed = False
+
+    def __len__(self):
+        self._keys._scan()
+        return len(self._queue)
+
+    def __bool__(self):
+        return len(self) > 0
+
+
+class Keys(object):
+    def __init__(self, pins, value_when_pressed, pull=True, interval=0.02,
+                 max_events=64):
+        self._pins = []
+        for pin in pins:
+            dio = digitalio.DigitalInOut(pin)
+            dio.direction = digitalio.Direction.INPUT
+            if pull:
+                dio.pull = (digitalio.Pull.DOWN if value_when_pressed
+                            else digitalio.Pull.UP)
+            self._pins.append(dio)
+        self._value_when_pressed = value_when_pressed
+        self._interval = interval
+        self.key_count = len(pins)
+        self.events = EventQueue(self, max_events)
+        self._next_scan = SIM.clock.now
+        self._state = [False] * len(pins)
+        self.reset()
+
+    def reset(self):
+        self._state = [self._is_pressed(k, SIM.clock.now)
+                       for k in range(self.key_count)]
+
+    def _is_pressed(self, k, t):
+        dio = self._pins[k]
+        signal = SIM.digital.get(dio.pin.name)
+        val = None if signal is None else signal.value_at(t)
+        if val is None:
+            val = dio.pull == digitalio.Pull.UP
+        return bool(val) == self._value_when_pressed
+
+    def _scan(self):
+        now = SIM.clock.now
+        while self._next_scan <= now:
+            t = self._next_scan
+            for k in range(self.key_count):
+                pressed = self._is_pressed(k, t)
+                if pressed != self._state[k]:
+                    self._state[k] = pressed
+                    self.events._put(k, pressed, supervisor.ticks_at(t))
+            self._next_scan += self._interval
+
+    def deinit(self):
+        pass
@@ -0,0 +1,91 @@
+# Simulated `neopixel`, API-compatible with the Adafruit library for what the
+# sketches use. Colors are stored unscaled; show() applies brightness and
+# pixel order and hands the bytes to neopixel_write, which logs the frame.
+
+import digitalio
+import neopixel_write
+
+RGB = 'RGB'
+GRB = 'GRB'
+RGBW = 'RGBW'
+GRBW = 'GRBW'
+
+
+class NeoPixel(object):
+    def __init__(self, pin, n, bpp=3, brightness=1.0, auto_write=True,
+                 pixel_order=None):
+        if pixel_order is None:
+            pixel_order = GRB if bpp == 3 else GRBW
+        self.pin = digitalio.DigitalInOut(pin)
+        self.pin.direction = digitalio.Direction.OUTPUT
+        self.n = n
+        self.bpp = len(pixel_order)
+        self.order = ['RGBW'.index(ch) for ch in pixel_order]
+        self.auto_write = False
+        self._pixels = [(0,) * self.bpp for _ in range(n)]
+        self._brightness = 1.0
+        self.brightness = brightness
+        self.auto_write = auto_write
+
+    def _color(self, value):
+        if isinstance(value, int):
+            value = ((value >> 16) & 0xff, (value >> 8) & 0xff, value & 0xff)
+        value = tuple(int(v) for v in value)
+        if len(value) < self.bpp:
+            value = value + (0,) * (self.bpp - len(value))
+        return value
+
+    def __len__(self):
+        return self.n
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            for (i, v) in zip(range(*index.indices(self.n)), value):
+                self._pixels[i] = self._color(v)
+        else:
+            if index < 0:
+                index += self.n
+            self._pixels[index] = self._color(value)
+        if self.auto_write:
+            self.show()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._pixels[i] for i in range(*index.indices(self.n))]
+        return self._pixels[index]
+
+    def fill(self, color):
+        color = self._color(color)
+        for i in range(self.n):
+            self._pixels[i] = color
+        if self.auto_write:
+            self.show()
+
+    @property
+    def brightness(self):
+        return self._brightness
+
+    @brightness.setter
+    def brightness(self, val):
+        self._brightness = min(max(val, 0.0), 1.0)
+        if self.auto_write:
+            self.show()
+
+    def show(self):
+        buf = bytearray(self.n * self.bpp)
+        bright = self._brightness
+        j = 0
+        for pixel in self._pixels:
+            for ch in self.order:
+                buf[j] = int(pixel[ch] * bright)
+                j += 1
+        neopixel_write.neopixel_write(self.pin, buf)
+
+    def deinit(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.deinit()
@@ -0,0 +1,8 @@
+# Simulated `neopixel_write`: every write lands in the pin's frame log and
+# advances the clock by the strip's transmission time.
+
+from sim import SIM
+
+
+def neopixel_write(digitalinout, buf):
+    SIM.write_strip(digitalinout.pin.name, buf)
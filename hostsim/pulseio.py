@@ -0,0 +1,56 @@
+# Simulated `pulseio`. PulseIn delivers the pin's scripted pulse bursts once
+# the clock passes each burst's start time. Every len() is treated as a poll
+# and costs a little time, so busy-wait loops still make progress.
+
+from sim import SIM, PULSE_POLL_SEC
+
+
+class PulseIn(object):
+    def __init__(self, pin, maxlen=2, idle_state=False):
+        self.pin = pin
+        self.maxlen = maxlen
+        self.idle_state = idle_state
+        self.paused = False
+        self._pulses = []
+        self._bursts = list(SIM.pulses.get(pin.name, ()))
+
+    def _pump(self):
+        SIM.clock.advance(PULSE_POLL_SEC)
+        while self._bursts and self._bursts[0][0] <= SIM.clock.now:
+            _t, burst = self._bursts.pop(0)
+            if not self.paused:
+                self._pulses.extend(burst)
+        if len(self._pulses) > self.maxlen:
+            del self._pulses[self.maxlen:]
+
+    def __len__(self):
+        self._pump()
+        return len(self._pulses)
+
+    def __getitem__(self, i):
+        return self._pulses[i]
+
+    def popleft(self):
+        return self._pulses.pop(0)
+
+    def clear(self):
+        self._pulses = []
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self, trigger_duration=0):
+        self.paused = False
+
+    def deinit(self):
+        pass
+
+
+class PWMOut(object):
+    def __init__(self, pin, duty_cycle=0, frequency=500, variable_frequency=False):
+        self.pin = pin
+        self.duty_cycle = duty_cycle
+        self.frequency = frequency
+
+    def deinit(self):
+        pass
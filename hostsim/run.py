@@ -0,0 +1,199 @@
+"""Run a CircuitPython sketch on the host against the simulated hardware.
+
+    python hostsim/run.py bikeleds/code.py --seconds 30
+    python hostsim/run.py predatorprey/neo_predprey.py --frames 500 --quiet
+    python hostsim/run.py test_sketches/ir_test.py --inputs ir_presses.json
+    python hostsim/run.py predatorprey/neo_predprey.py --frames 3000 --alloc
+    python hostsim/run.py bikeleds/code.py --frames 6000 --alloc --alloc-max 0.5
+    python hostsim/run.py predatorprey/neo_predprey.py --frames 500 --seed 1
+
+Sketches run unmodified: this directory (the fake hardware modules), the
+repo's lib/ (what goes in the board's lib/) and the sketch's own directory go
+on sys.path, `time.monotonic` and `time.sleep` are switched to the virtual
+clock in sim.py, and the sketch is stopped once it reaches --seconds of
+virtual time or --frames frames on any strip. --seed seeds the random
+module first, so sketches that use it replay the same run. Sketches that use
+Adafruit's pure-Python libraries need those installed on the host
+(adafruit-circuitpython-fancyled, adafruit-circuitpython-irremote).
+
+--alloc traces memory allocated by the sketch and lib/ code (not hostsim's)
+with tracemalloc, from the end of a warm-up (default 1000 frames) until the
+sketch stops, and reports the net heap growth per frame and where it came
+from. A main loop that doesn't leak or accumulate shows 0 B/frame; over
+--alloc-max B/frame (default 1) the run fails, exiting 1. Caches filling up
+after the warm-up count too: the default warm-up covers bikeleds' frame
+cache, and golden.py checks that sketch this way. Objects allocated and
+freed within a frame don't show up, and CPython allocates where
+CircuitPython doesn't (e.g. floats), so for allocation churn use
+lib/profiler.py on the board.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import runpy
+import sys
+import time
+import tracemalloc
+
+# Default --alloc-max: more net heap growth per frame than this fails. A
+# real leak of even this much fills the M0's heap within minutes.
+ALLOC_MAX_PER_FRAME = 1.0
+# Default --alloc warm-up, in frames. Long enough for bikeleds/code.py to
+# have rendered each palette into its frame cache.
+ALLOC_WARMUP = 1000
+
+HOSTSIM_DIR = os.path.dirname(os.path.abspath(__file__))
+LIB_DIR = os.path.join(os.path.dirname(HOSTSIM_DIR), 'lib')
+
+if HOSTSIM_DIR not in sys.path:
+    sys.path.insert(0, HOSTSIM_DIR)
+
+from sim import SIM, StopSimulation
+
+
+# Puts the fake hardware modules, lib/ and the sketch's directory on sys.path
+# and points the time module at the virtual clock. Benchmarks that import
+# sketch modules directly call this first.
+def install(sketch_dir=None):
+    for path in [sketch_dir, LIB_DIR, HOSTSIM_DIR]:
+        if path and path not in sys.path:
+            sys.path.insert(0, path)
+    # Look the clock up on each call, SIM.reset() replaces it.
+    time.monotonic = lambda: SIM.clock.monotonic()
+    time.monotonic_ns = lambda: SIM.clock.monotonic_ns()
+    time.sleep = lambda secs: SIM.clock.sleep(secs)
+
+
+# Snapshots of the sketch's allocations for --alloc: one once warmup frames
+# have gone out on any strip, one when the run stops. Pass one to run().
+class AllocTracker(object):
+    def __init__(self, sketch, warmup=ALLOC_WARMUP,
+                 max_per_frame=ALLOC_MAX_PER_FRAME):
+        self.warmup = warmup
+        self.max_per_frame = max_per_frame
+        sketch_dir = os.path.dirname(os.path.abspath(sketch))
+        self.filters = [tracemalloc.Filter(True, os.path.join(d, '*'))
+                        for d in (sketch_dir, LIB_DIR)]
+        self.start = None
+        self.start_frames = 0
+        self.end = None
+        self.frames = 0
+
+    def on_frame(self, log):
+        if self.start is None and log.count >= self.warmup:
+            self.start = tracemalloc.take_snapshot().filter_traces(self.filters)
+            self.start_frames = log.count
+
+    def stop(self):
+        if self.start is not None and self.end is None:
+            self.end = tracemalloc.take_snapshot().filter_traces(self.filters)
+            self.frames = (max(log.count for log in SIM.strips.values())
+                           - self.start_frames)
+        tracemalloc.stop()
+
+    # Prints the growth and returns whether it's within max_per_frame. A
+    # run too short to measure isn't.
+    def report(self, top=5):
+        if self.end is None or not self.frames:
+            print('alloc: run ended before {} warm-up frames'.format(self.warmup))
+            return False
+        diffs = self.end.compare_to(self.start, 'lineno')
+        growth = sum(d.size_diff for d in diffs)
+        per_frame = growth / self.frames
+        print('alloc: {} B net over {} frames, {:.1f} B/frame'.format(
+            growth, self.frames, per_frame))
+        for d in diffs[:top]:
+            if d.size_diff:
+                print('  {:+d} B  {}'.format(d.size_diff, d.traceback))
+        if per_frame > self.max_per_frame:
+            print('alloc: FAIL, over {:g} B/frame'.format(self.max_per_frame))
+            return False
+        return True
+
+
+# on_frame, if given, is called with the FrameLog after each frame (see
+# sim.Sim.frame_hook), unless alloc is.
+def run(sketch, seconds=None, frames=None, inputs=None, cpu_scale=0,
+        quiet=False, alloc=None, seed=None, on_frame=None):
+    if seconds is None and frames is None:
+        raise ValueError('need --seconds or --frames, sketches loop forever')
+    SIM.reset(seconds=seconds, frames=frames, cpu_scale=cpu_scale)
+    if inputs:
+        SIM.load_script_file(inputs)
+    install(os.path.dirname(os.path.abspath(sketch)))
+    if seed is not None:
+        random.seed(seed)
+    SIM.frame_hook = on_frame
+    if alloc:
+        SIM.frame_hook = alloc.on_frame
+        tracemalloc.start()
+    out = io.StringIO() if quiet else sys.stdout
+    reason = 'sketch exited'
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(out):
+        try:
+            runpy.run_path(sketch, run_name='__main__')
+        except StopSimulation as e:
+            reason = str(e)
+            # While the traceback still holds the sketch's globals.
+            if alloc:
+                alloc.stop()
+    wall = time.perf_counter() - start
+    if alloc:
+        alloc.stop()
+        SIM.frame_hook = None
+    return reason, wall
+
+
+def report(reason, wall):
+    vtime = SIM.clock.now
+    print('stopped: {}'.format(reason))
+    print('virtual time: {:.3f}s (slept {:.3f}s)  wall time: {:.3f}s'.format(
+        vtime, SIM.clock.slept, wall))
+    for log in SIM.strips.values():
+        print('strip {}: {} frames, {} bytes/frame, {:.1f} fps virtual, '
+              '{:.1f} fps wall'.format(
+                  log.name, log.count,
+                  log.bytes_sent // log.count if log.count else 0,
+                  log.count / vtime if vtime else 0,
+                  log.count / wall if wall else 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('sketch')
+    parser.add_argument('--seconds', type=float,
+                        help='stop after this much virtual time')
+    parser.add_argument('--frames', type=int,
+                        help='stop after this many frames on any strip')
+    parser.add_argument('--inputs', help='JSON input script, see sim.py')
+    parser.add_argument('--cpu-scale', type=float, default=0,
+                        help='also count host CPU time, times this factor')
+    parser.add_argument('--quiet', action='store_true',
+                        help="discard the sketch's own output")
+    parser.add_argument('--seed', type=int,
+                        help='seed the random module before the sketch starts')
+    parser.add_argument('--alloc', type=int, nargs='?', const=ALLOC_WARMUP,
+                        metavar='WARMUP_FRAMES',
+                        help='report heap growth per frame after a warm-up '
+                             '(default %(const)d frames)')
+    parser.add_argument('--alloc-max', type=float, default=ALLOC_MAX_PER_FRAME,
+                        metavar='BYTES',
+                        help='with --alloc, fail over this much growth per '
+                             'frame (default %(default)g)')
+    args = parser.parse_args()
+    alloc = (AllocTracker(args.sketch, args.alloc, args.alloc_max)
+             if args.alloc else None)
+    reason, wall = run(args.sketch, seconds=args.seconds, frames=args.frames,
+                       inputs=args.inputs, cpu_scale=args.cpu_scale,
+                       quiet=args.quiet, alloc=alloc, seed=args.seed)
+    report(reason, wall)
+    if alloc and not alloc.report():
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
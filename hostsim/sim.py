@@ -0,0 +1,162 @@
+"""Shared state for the simulated CircuitPython hardware modules.
+
+The fake `board`, `digitalio`, `analogio`, `simpleio`, `pulseio`, `neopixel`
+and `neopixel_write` modules in this directory all talk to the objects here:
+a virtual monotonic clock, scripted input signals and a log of every frame
+written out to a LED strip. `run.py` wires them up and runs a sketch.
+"""
+
+import bisect
+import json
+import time
+
+
+# Modeled hardware costs, in seconds. Strip transmission dominates: WS2812s
+# clock 24 bits per pixel at 800kHz plus a latch period.
+NEOPIXEL_BIT_SEC = 1.25e-6
+NEOPIXEL_LATCH_SEC = 80e-6
+ANALOG_READ_SEC = 10e-6
+DIGITAL_READ_SEC = 1e-6
+PULSE_POLL_SEC = 1e-3
+# Charged per clock read when CPU time isn't counted, so a loop that only
+# polls the clock (e.g. skipping unchanged frames) still lets time pass.
+CLOCK_READ_SEC = 20e-6
+
+# How long a button is held for each entry in a script's "presses" list.
+PRESS_SEC = 0.08
+
+# Frames kept per strip. Older frames are only counted.
+FRAME_LOG_LEN = 1000
+
+ANALOG_MID = 32768
+
+
+class StopSimulation(BaseException):
+    # BaseException so sketches' own except clauses can't swallow it.
+    pass
+
+
+class VirtualClock(object):
+    def __init__(self, cpu_scale=0):
+        # If cpu_scale > 0, host CPU time spent between clock reads is also
+        # counted, multiplied by cpu_scale (i.e. how much slower the board is
+        # than this machine). Otherwise time only moves for modeled hardware
+        # costs and sleeps, which keeps runs deterministic.
+        self.cpu_scale = cpu_scale
+        self.now = 0.0
+        self.deadline = None
+        self.slept = 0.0
+        self._last_cpu = time.perf_counter()
+
+    def _sync_cpu(self):
+        if self.cpu_scale:
+            cpu = time.perf_counter()
+            self.now += (cpu - self._last_cpu) * self.cpu_scale
+            self._last_cpu = cpu
+
+    def advance(self, secs):
+        self._sync_cpu()
+        self.now += secs
+        if self.deadline is not None and self.now >= self.deadline:
+            raise StopSimulation('reached {:.3f}s'.format(self.deadline))
+
+    def monotonic(self):
+        if self.cpu_scale:
+            self._sync_cpu()
+        else:
+            self.advance(CLOCK_READ_SEC)
+        return self.now
+
+    def monotonic_ns(self):
+        return int(self.monotonic() * 1e9)
+
+    def sleep(self, secs):
+        if secs > 0:
+            self.slept += secs
+            self.advance(secs)
+
+
+# Step function over time: a sorted list of (time, value) changes.
+class Signal(object):
+    def __init__(self, changes=(), default=None):
+        self._times = [t for (t, _) in changes]
+        self._values = [v for (_, v) in changes]
+        self.default = default
+
+    def value_at(self, t):
+        i = bisect.bisect_right(self._times, t)
+        if i == 0:
+            return self.default
+        return self._values[i - 1]
+
+
+class FrameLog(object):
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.bytes_sent = 0
+        self.frames = []  # (time, bytes), most recent FRAME_LOG_LEN
+
+    def record(self, t, buf):
+        self.count += 1
+        self.bytes_sent += len(buf)
+        self.frames.append((t, bytes(buf)))
+        if len(self.frames) > FRAME_LOG_LEN:
+            del self.frames[:len(self.frames) - FRAME_LOG_LEN]
+
+
+class Sim(object):
+    def __init__(self):
+        self.reset()
+
+    def reset(self, seconds=None, frames=None, cpu_scale=0):
+        self.clock = VirtualClock(cpu_scale)
+        if seconds is not None:
+            self.clock.deadline = seconds
+        self.max_frames = frames
+        self.digital = {}  # pin name -> Signal of bools
+        self.analog = {}  # pin name -> Signal of 0..65535
+        self.pulses = {}  # pin name -> list of (time, [durations])
+        self.strips = {}  # pin name -> FrameLog
+        self.frame_hook = None  # called with the FrameLog after each frame
+
+    # Script format (JSON), all keys optional, times in seconds:
+    #   {"digital": {"D11": [[1.0, false], [1.1, true]]},
+    #    "presses": {"D11": [1.0, 2.5]},       # pulled-up button, held PRESS_SEC
+    #    "analog":  {"A3": [[0, 32768], [2.0, 40000]]},
+    #    "pulses":  {"D2": [[0.5, [9000, 4500, 560, 560]]]}}
+    def load_script(self, script):
+        for (pin, changes) in script.get('digital', {}).items():
+            self.digital[pin] = Signal(changes)
+        for (pin, times) in script.get('presses', {}).items():
+            changes = []
+            for t in sorted(times):
+                changes.append((t, False))
+                changes.append((t + PRESS_SEC, True))
+            self.digital[pin] = Signal(changes)
+        for (pin, changes) in script.get('analog', {}).items():
+            self.analog[pin] = Signal(changes, ANALOG_MID)
+        for (pin, bursts) in script.get('pulses', {}).items():
+            self.pulses[pin] = sorted(bursts, key=lambda b: b[0])
+
+    def load_script_file(self, path):
+        with open(path) as f:
+            self.load_script(json.load(f))
+
+    def strip(self, pin_name):
+        log = self.strips.get(pin_name)
+        if log is None:
+            log = self.strips[pin_name] = FrameLog(pin_name)
+        return log
+
+    def write_strip(self, pin_name, buf):
+        self.clock.advance(len(buf) * 8 * NEOPIXEL_BIT_SEC + NEOPIXEL_LATCH_SEC)
+        log = self.strip(pin_name)
+        log.record(self.clock.now, buf)
+        if self.frame_hook:
+            self.frame_hook(log)
+        if self.max_frames is not None and log.count >= self.max_frames:
+            raise StopSimulation('{} frames on {}'.format(log.count, pin_name))
+
+
+SIM = Sim()
@@ -0,0 +1,24 @@
+# Simulated `simpleio`, just the parts the sketches use.
+
+import digitalio
+
+
+class DigitalOut(object):
+    def __init__(self, pin, value=False):
+        self._dio = digitalio.DigitalInOut(pin)
+        self._dio.switch_to_output(value)
+
+    @property
+    def value(self):
+        return self._dio.value
+
+    @value.setter
+    def value(self, val):
+        self._dio.value = val
+
+
+def map_range(x, in_min, in_max, out_min, out_max):
+    mapped = (x - in_min) * (out_max - out_min) / (in_max - in_min) + out_min
+    if out_min <= out_max:
+        return max(min(mapped, out_max), out_min)
+    return min(max(mapped, out_max), out_min)
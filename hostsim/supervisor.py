@@ -0,0 +1,13 @@
+# Simulated `supervisor`, just the millisecond tick counter.
+
+from sim import SIM
+
+TICKS_PERIOD = 1 << 29
+
+
+def ticks_at(t):
+    return int(t * 1000) % TICKS_PERIOD
+
+
+def ticks_ms():
+    return ticks_at(SIM.clock.monotonic())
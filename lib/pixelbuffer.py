@@ -0,0 +1,151 @@
+# A strip's pixels as a single preallocated bytearray in wire order, sent
+# with neopixel_write. Replaces neopixel.NeoPixel in the sketches: NeoPixel
+# converts every pixel's color order and brightness on each write, while
+# here per-pixel writes go straight into the buffer and renderers that
+# already have wire-order bytes can copy them in bulk.
+#
+# show() keeps a copy of what was last sent and skips the transmission when
+# the frame hasn't changed, which is most of the cost of a frame on a long
+# strip. Renderers can just draw every tick.
+#
+# Copy to the board's lib/ directory.
+
+import digitalio
+import neopixel_write
+
+# Wire position of the (r, g, b) channels.
+GRB = (1, 0, 2)
+RGB = (0, 1, 2)
+
+
+# Maps a 0-255 channel value to its value at bright (0-1), and through gamma
+# if given (e.g. 2.2, so steps look even to the eye), as a 256-entry table.
+# Built only when brightness changes, so scaling a channel per write is an
+# index instead of float math, which the M0 does in software.
+def brightness_table(bright, gamma=None):
+    table = bytearray(256)
+    for v in range(256):
+        if gamma is None:
+            table[v] = int(v * bright)
+        else:
+            table[v] = int(255 * bright * (v / 255) ** gamma + 0.5)
+    return table
+
+
+# Reverses buf[i:j] in place.
+def _reverse(buf, i, j):
+    j -= 1
+    while i < j:
+        buf[i], buf[j] = buf[j], buf[i]
+        i += 1
+        j -= 1
+
+
+class PixelBuffer(object):
+    __slots__ = ('n', 'buf', 'shown', 'skipped', '_pin', '_sent',
+                 '_ro', '_go', '_bo', '_bright', '_gamma', '_lut')
+
+    # diff=False drops the sent copy (3 bytes per pixel) and sends every frame.
+    def __init__(self, pin, n, brightness=1.0, order=GRB, diff=True,
+                 gamma=None):
+        self._pin = digitalio.DigitalInOut(pin)
+        self._pin.direction = digitalio.Direction.OUTPUT
+        self.n = n
+        self.buf = bytearray(3 * n)
+        # Copy of the last frame sent, None if not diffing. It starts empty so
+        # the first show() always sends.
+        self._sent = bytearray() if diff else None
+        self.shown = 0  # frames sent
+        self.skipped = 0  # frames not sent because nothing changed
+        self._ro, self._go, self._bo = order
+        self._gamma = gamma
+        # Applied to per-pixel writes only. Bulk writes take bytes as-is.
+        self.brightness = brightness
+
+    @property
+    def brightness(self):
+        return self._bright
+
+    @brightness.setter
+    def brightness(self, bright):
+        self._bright = bright
+        if bright >= 1.0 and self._gamma is None:
+            self._lut = None
+        else:
+            self._lut = brightness_table(min(bright, 1.0), self._gamma)
+
+    def __len__(self):
+        return self.n
+
+    # Sets one pixel (or a slice of pixels, from a sequence of colors). A
+    # color is an (r, g, b) tuple or a packed 0xRRGGBB int, as returned by
+    # fancyled's pack().
+    def __setitem__(self, index, color):
+        if type(index) is slice:
+            for (i, c) in zip(range(*index.indices(self.n)), color):
+                self[i] = c
+            return
+        if type(color) is int:
+            self.set_rgb(index, (color >> 16) & 0xff, (color >> 8) & 0xff,
+                         color & 0xff)
+        else:
+            self.set_rgb(index, color[0], color[1], color[2])
+
+    def __getitem__(self, index):
+        j = 3 * index
+        buf = self.buf
+        return (buf[j + self._ro], buf[j + self._go], buf[j + self._bo])
+
+    def set_rgb(self, index, r, g, b):
+        lut = self._lut
+        if lut is not None:
+            r, g, b = lut[r], lut[g], lut[b]
+        j = 3 * index
+        buf = self.buf
+        buf[j + self._ro] = r
+        buf[j + self._go] = g
+        buf[j + self._bo] = b
+
+    def fill(self, color):
+        self[0] = color
+        buf = self.buf
+        c0, c1, c2 = buf[0], buf[1], buf[2]
+        for j in range(3, len(buf), 3):
+            buf[j] = c0
+            buf[j + 1] = c1
+            buf[j + 2] = c2
+
+    # Copies wire-order bytes in, starting at pixel `start`.
+    def write(self, data, start=0):
+        j = 3 * start
+        self.buf[j:j + len(data)] = data
+
+    # Shifts every pixel k places towards the start of the strip, wrapping
+    # around. Rotates the buffer in place by three reversals, so it needs no
+    # scratch buffer and doesn't allocate.
+    def rotate(self, k):
+        k = 3 * (k % self.n)
+        if not k:
+            return
+        buf = self.buf
+        _reverse(buf, 0, k)
+        _reverse(buf, k, len(buf))
+        _reverse(buf, 0, len(buf))
+
+    # Sends the frame unless it's the same as the last one sent (or force).
+    def show(self, force=False):
+        sent = self._sent
+        if sent is not None:
+            if not force and self.buf == sent:
+                self.skipped += 1
+                return False
+            sent[:] = self.buf
+        neopixel_write.neopixel_write(self._pin, self.buf)
+        self.shown += 1
+        return True
+
+    # (sent, skipped) frame counts since the last call.
+    def stats(self):
+        counts = (self.shown, self.skipped)
+        self.shown = self.skipped = 0
+        return counts
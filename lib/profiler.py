@@ -0,0 +1,149 @@
+# Per-frame timing for sketch main loops: named sections, fps, the worst
+# frame and memory allocated per frame, printed (or appended to a file) every
+# few seconds.
+#
+#   prof = profiler.create(('input', 'render', 'show'), enabled=PROFILE)
+#   while True:
+#       prof.start()
+#       read_inputs()
+#       prof.lap(0)  # time since start() goes to 'input'
+#       draw()
+#       prof.lap(1)
+#       neos.show()
+#       prof.lap(2)
+#       prof.end()
+#
+# Sections are indexes, so a lap is a clock read and some integer adds.
+# Times are supervisor.ticks_ms() milliseconds, which stay small ints on the
+# M0 (ticks_ms() is a long int there, and allocates). A lap is only
+# good to a millisecond, but averaged over a report's frames that still
+# resolves shorter sections. Disabled, create() returns an object whose
+# methods do nothing.
+#
+# Copy to the board's lib/ directory.
+
+import gc
+import time
+
+# gc.mem_free() is CircuitPython's; on the host there's no allocation count.
+_mem_free = getattr(gc, 'mem_free', None)
+
+_TICKS_PERIOD = 1 << 29  # supervisor.ticks_ms() wraps here
+
+try:
+    from supervisor import ticks_ms
+except ImportError:
+    # The host, without hostsim.
+    def ticks_ms():
+        return int(time.monotonic() * 1000) % _TICKS_PERIOD
+
+
+# Milliseconds from tick start to tick end, across a wrap.
+def ticks_diff(end, start):
+    return (end - start) % _TICKS_PERIOD
+
+
+class Profiler(object):
+    # Reports every period seconds. If path is given, reports are appended
+    # to that file instead of printed (which needs a writable filesystem,
+    # see bikeleds/boot.py).
+    def __init__(self, sections, period=5, path=None):
+        self.sections = sections
+        self.period_ms = int(period * 1000)
+        self.path = path
+        n = len(sections)
+        self._total = [0] * n  # ms per section since the last report
+        self._max = [0] * n
+        self._frames = 0
+        self._worst = 0
+        self._alloc = 0
+        self._gcs = 0  # frames where free memory went up, i.e. gc ran
+        self._frame_start = 0
+        self._lap_start = 0
+        self._mem_start = 0
+        self._report_start = ticks_ms()
+
+    def start(self):
+        if _mem_free:
+            self._mem_start = _mem_free()
+        self._frame_start = self._lap_start = ticks_ms()
+
+    # Charges the time since the last lap (or start()) to section i.
+    def lap(self, i):
+        now = ticks_ms()
+        dt = ticks_diff(now, self._lap_start)
+        self._lap_start = now
+        self._total[i] += dt
+        if dt > self._max[i]:
+            self._max[i] = dt
+
+    # Returns True if it just printed a report, for sketches that add their
+    # own counters after it.
+    def end(self):
+        now = ticks_ms()
+        frame = ticks_diff(now, self._frame_start)
+        if frame > self._worst:
+            self._worst = frame
+        if _mem_free:
+            used = self._mem_start - _mem_free()
+            if used >= 0:
+                self._alloc += used
+            else:
+                self._gcs += 1
+        self._frames += 1
+        if ticks_diff(now, self._report_start) >= self.period_ms:
+            self.report(now)
+            return True
+        return False
+
+    def report(self, now=None):
+        if now is None:
+            now = ticks_ms()
+        frames = max(1, self._frames)
+        secs = ticks_diff(now, self._report_start) / 1000
+        line = 'prof: {:.1f} fps  worst {}ms'.format(
+            self._frames / secs if secs else 0, self._worst)
+        if _mem_free:
+            line += '  alloc {}B/frame  gc {}  free {}'.format(
+                self._alloc // frames, self._gcs, _mem_free())
+        for (i, name) in enumerate(self.sections):
+            line += '  {} {:.2f}/{}ms'.format(
+                name, self._total[i] / frames, self._max[i])
+        if self.path:
+            try:
+                with open(self.path, 'a') as f:
+                    f.write(line + '\n')
+            except OSError as e:
+                print('prof: not writing {}: {}'.format(self.path, e))
+                self.path = None
+                print(line)
+        else:
+            print(line)
+        for i in range(len(self._total)):
+            self._total[i] = 0
+            self._max[i] = 0
+        self._frames = self._worst = self._alloc = self._gcs = 0
+        self._report_start = ticks_ms()
+
+
+class _NullProfiler(object):
+    def start(self):
+        pass
+
+    def lap(self, i):
+        pass
+
+    def end(self):
+        return False
+
+    def report(self, now=None):
+        pass
+
+
+NULL = _NullProfiler()
+
+
+def create(sections, enabled=True, period=5, path=None):
+    if not enabled:
+        return NULL
+    return Profiler(sections, period, path)
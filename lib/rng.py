@@ -0,0 +1,62 @@
+# A small seeded random number generator that gives the same stream on
+# CircuitPython and on the host, for runs that need to be replayed: golden
+# traces, benchmarks across engine versions, a world seen on the board
+# rerun in hostsim.
+#
+#   rand = rng.Rng(42)
+#   if rand.random() < 0.5: ...
+#   d = rand.getrandbits(3)
+#
+# It has the parts of the random module's interface the sketches use, so
+# code that takes an rng can be handed either; the module stays the default,
+# as CircuitPython's is C and so quicker than any generator written in
+# Python, but seeds differently on every platform.
+#
+# Two multiply-with-carry generators on 15-bit digits, combined. xorshift
+# and PCG need 32 or 64-bit arithmetic, which CircuitPython does with heap
+# allocated long ints; these keep every value under 2**30, in small ints,
+# so drawing a number never allocates. Each multiplier a makes a * 2**15 - 1
+# a safe prime with 2**15 of order (a * 2**15 - 2) / 2 mod it, so each has
+# a period of about 2**29, and the pair about 2**58.
+#
+# Copy to the board's lib/ directory.
+
+_A1 = 32760
+_A2 = 32730
+_P1 = _A1 * 32768 - 1  # states 0 and P are fixed points
+_P2 = _A2 * 32768 - 1
+
+
+class Rng(object):
+    def __init__(self, seed=0):
+        self.seed(seed)
+
+    def seed(self, n=0):
+        n &= 0x3fffffff
+        self._z = n % (_P1 - 1) + 1
+        self._w = (n ^ 0x2545f491) % (_P2 - 1) + 1
+        # Nearby seeds start out nearly equal; a few steps spread them apart.
+        for _ in range(8):
+            self.getrandbits(0)
+
+    # k random bits as an int, for k up to 30.
+    def getrandbits(self, k):
+        z = self._z
+        z = _A1 * (z & 0x7fff) + (z >> 15)
+        w = self._w
+        w = _A2 * (w & 0x7fff) + (w >> 15)
+        self._z = z
+        self._w = w
+        return (((z & 0x7fff) << 15) | (w & 0x7fff)) >> (30 - k)
+
+    # A float in [0, 1), in steps of 2**-20: CircuitPython's floats don't
+    # hold more, and this way the host's are the same numbers.
+    def random(self):
+        return self.getrandbits(20) / 1048576.0
+
+    def uniform(self, a, b):
+        return a + (b - a) * self.random()
+
+    # An int in [a, b].
+    def randint(self, a, b):
+        return a + int(self.random() * (b - a + 1))
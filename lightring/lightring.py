@@ -1,14 +1,29 @@
+import random
+
 import board
 import simpleio
 
 import lightring_lib
+import profiler
+import rng
 
+PROFILE = False  # print section times and fps every few seconds
+PROF_RENDER, PROF_SHOW, PROF_SIMULATE = range(3)
+SEED = None  # an int replays the same run, on the board or in hostsim
+RNG = random if SEED is None else rng.Rng(SEED)
+prof = profiler.create(('render', 'show', 'simulate'), enabled=PROFILE)
 
 board_led = simpleio.DigitalOut(board.D13)
 board_led.value = True
-world = lightring_lib.World(board.D0)
+world = lightring_lib.World(board.D0, rng=RNG)
 
 while True:
+    prof.start()
     board_led.value = not board_led.value
     world.draw()
+    prof.lap(PROF_RENDER)
+    world.show()
+    prof.lap(PROF_SHOW)
     world.step()
+    prof.lap(PROF_SIMULATE)
+    prof.end()
@@ -1,7 +1,7 @@
 import random
 
 from adafruit_fancyled import adafruit_fancyled as fancy
-import neopixel
+import pixelbuffer
 
 BRIGHTNESS = 0.25
 NLEDS = 30
@@ -11,6 +11,7 @@ BOUNCE = True  # turn around vs. wrap around at edges
 TAIL_BRIGHT_DECAY = 0.70
 TAIL_HUE_SHIFT = 0.025
 HEAD_HUE_SHIFT = 0.005
+HUE_STEPS = 64  # hues in the color table, a power of two
 # SPEED_DECAY = 0.995
 # SPEED_TO_GC = 0.4
 
@@ -26,24 +27,50 @@ def wrap(x, a=0, b=NLEDS):
     return (x, False)
 
 RAND_HUE_STATE = 0
-def rand_hue():
+def rand_hue(rng=random):
     global RAND_HUE_STATE
-    RAND_HUE_STATE = (RAND_HUE_STATE + random.uniform(.15, .33)) % 1
+    RAND_HUE_STATE = (RAND_HUE_STATE + rng.uniform(.15, .33)) % 1
     return RAND_HUE_STATE
 
 
+# Tail brightness by age in frames, while it's still visible: 1.0, then
+# decaying by TAIL_BRIGHT_DECAY a frame.
+def tail_brights():
+    brights = []
+    bright = 1.0
+    while int(bright * 256.0) > 0:
+        brights.append(bright)
+        bright *= TAIL_BRIGHT_DECAY
+    return brights
+
+# Colors by hue step and tail age, as r, g, b bytes; the last age of each hue
+# is off. Built once, so drawing a pixel is a table lookup rather than an HSV
+# conversion and a CHSV and CRGB allocation per pixel per frame.
+def color_table(brights):
+    ages = len(brights) + 1
+    table = bytearray(3 * HUE_STEPS * ages)
+    for h in range(HUE_STEPS):
+        for (age, bright) in enumerate(brights):
+            color = fancy.CHSV(h / HUE_STEPS, 1.0, bright).pack()
+            j = 3 * (h * ages + age)
+            table[j] = color >> 16
+            table[j + 1] = (color >> 8) & 0xff
+            table[j + 2] = color & 0xff
+    return table
+
+
 class Particle(object):
-    def __init__(self, pos=None, dir=None, speed=None):
+    def __init__(self, pos=None, dir=None, speed=None, rng=random):
         if pos is None:
-            pos = random.random() * NLEDS
+            pos = rng.random() * NLEDS
         if dir is None:
-            dir = 1 if (random.random() > 0.5) else -1
+            dir = 1 if (rng.random() > 0.5) else -1
         if speed is None:
-            speed = 0.5 + random.random() / 2
+            speed = 0.5 + rng.random() / 2
         self.pos = pos
         self.dir = dir
         self.speed = speed
-        self.hue = rand_hue()
+        self.hue = rand_hue(rng)
 
     def step(self):
         self.hue += HEAD_HUE_SHIFT
@@ -58,22 +85,26 @@ class Particle(object):
 
 
 class World(object):
-    def __init__(self, neo_pin):
+    # rng is the random module, or a seeded lib/rng.py Rng to replay a run.
+    def __init__(self, neo_pin, rng=random):
         if NPARTICLES == 2:
             self.particles = [
-                Particle(pos=0, dir=1, speed=1),
-                Particle(pos=NLEDS-1, dir=-1, speed=1),
+                Particle(pos=0, dir=1, speed=1, rng=rng),
+                Particle(pos=NLEDS-1, dir=-1, speed=1, rng=rng),
             ]
         # elif NPARTICLES == 3:
         #     self.particles = [
-        #         Particle(pos=0, dir=1, speed=1),
-        #         Particle(pos=NLEDS//2, dir=-1, speed=1),
-        #         Particle(pos=NLEDS-1, dir=-1, speed=1),
+        #         Particle(pos=0, dir=1, speed=1, rng=rng),
+        #         Particle(pos=NLEDS//2, dir=-1, speed=1, rng=rng),
+        #         Particle(pos=NLEDS-1, dir=-1, speed=1, rng=rng),
         #     ]
         else:
-            self.particles = [Particle() for _ in range(NPARTICLES)]
-        self.pixels = [[0,0] for _ in range(NLEDS)]
-        self.neos = neopixel.NeoPixel(neo_pin, NLEDS, brightness=BRIGHTNESS, auto_write=False)
+            self.particles = [Particle(rng=rng) for _ in range(NPARTICLES)]
+        brights = tail_brights()
+        self.tail_ages = len(brights)  # ages that are still lit
+        self.colors = color_table(brights)
+        self.pixels = [[0, self.tail_ages] for _ in range(NLEDS)]  # hue, age
+        self.neos = pixelbuffer.PixelBuffer(neo_pin, NLEDS, brightness=BRIGHTNESS)
 
     def step(self):
         for (i, p) in enumerate(self.particles):
@@ -82,11 +113,23 @@ class World(object):
             #     self.particles[i] = Particle()
 
     def draw(self):
-        for i in range(NLEDS):
-            self.pixels[i][1] *= TAIL_BRIGHT_DECAY
-            self.pixels[i][0] -= TAIL_HUE_SHIFT
+        last = self.tail_ages
+        for pixel in self.pixels:
+            if pixel[1] < last:
+                pixel[1] += 1
+            pixel[0] = (pixel[0] - TAIL_HUE_SHIFT) % 1.0
         for p in self.particles:
-            self.pixels[int(p.pos)] = [p.hue, 1.0]
-        for (i, (hue, bright)) in enumerate(self.pixels):
-            self.neos[i] = fancy.CHSV(hue, 1.0, bright).pack()
+            pixel = self.pixels[int(p.pos)]
+            pixel[0] = p.hue % 1.0
+            pixel[1] = 0
+        colors = self.colors
+        set_rgb = self.neos.set_rgb
+        ages = last + 1
+        mask = HUE_STEPS - 1
+        for (i, (hue, age)) in enumerate(self.pixels):
+            # & wraps a hue of 1.0, which % 1.0 can round up to.
+            j = 3 * ((int(hue * HUE_STEPS) & mask) * ages + age)
+            set_rgb(i, colors[j], colors[j + 1], colors[j + 2])
+
+    def show(self):
         self.neos.show()
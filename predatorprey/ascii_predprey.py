@@ -7,6 +7,8 @@
 import random
 import time
 
+import predprey_lib
+
 # import analogio
 # import board
 # import digitalio
@@ -26,6 +28,8 @@ PREY_BREED_PROB = 0.8
 # world config
 GRID_ROWS = 16
 GRID_COLS = 16
+WRAPAROUND = False
+SEED = None  # an int replays the same run
 
 # physical config
 # NEOS_PIN = board.D12
@@ -39,11 +43,11 @@ BRIGHT_INC = (BRIGHT_MAX - BRIGHT_MIN ) / 10
 CELL_EMPTY = 0
 CELL_PREY = 1
 CELL_PREDATOR = 2
-NEIGHBOR_DIRS = [
-  [-1, -1], [0, -1], [1, -1],
-  [-1, 0], [0, 1],
-  [-1, 1], [0, 1], [1, 1]
-]
+# Neighbor searches use predprey_lib's tables (see World.find_cell there)
+# rather than shuffling the directions and bounds checking each time.
+NEIGHBORS = predprey_lib.neighbor_table(GRID_ROWS, GRID_COLS, WRAPAROUND)
+SCAN_ORDERS = predprey_lib.scan_orders()
+DIRS_LEN = predprey_lib.DIRS_LEN
 
 PREDATOR_HUE = 0
 PREY_HUE = 120
@@ -142,15 +146,14 @@ class World(object):
         time.sleep(.1)
 
     def find_cell(self, row, col, typ):
-        random.shuffle(NEIGHBOR_DIRS)
-        for (rd, cd) in NEIGHBOR_DIRS:
-          r2 = rd + row
-          c2 = cd + col
-          # TODO: wraparound?
-          if r2 < 0 or r2 >= GRID_ROWS or c2 < 0 or c2 >= GRID_COLS:
-              continue
-          if self.grid[r2][c2].type == typ:
-              return (r2, c2)
+        base = DIRS_LEN * (row * GRID_COLS + col)
+        o = DIRS_LEN * random.getrandbits(predprey_lib.SCAN_ORDER_BITS)
+        for k in range(o, o + DIRS_LEN):
+            j = NEIGHBORS[base + SCAN_ORDERS[k]]
+            if j >= 0:
+                (r2, c2) = divmod(j, GRID_COLS)
+                if self.grid[r2][c2].type == typ:
+                    return (r2, c2)
         return None
 
     def step(self):
@@ -227,6 +230,8 @@ def init_world():
 # board_led.value = True
 # neos = NeoGrid()
 
+if SEED is not None:
+    random.seed(SEED)
 world = init_world()
 
 while True:
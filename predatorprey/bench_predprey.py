@@ -0,0 +1,102 @@
+"""Time predprey_lib.World steps at several grid sizes (host only).
+
+    python predatorprey/bench_predprey.py
+    python predatorprey/bench_predprey.py --sizes 16 64 --steps 500 --wrap
+    python predatorprey/bench_predprey.py --batch 16384 --sizes 16 32
+    python predatorprey/bench_predprey.py --sizes 256 --set init_prey_frac=0.01 --set prey_breed_cycle=20
+
+Each size runs the way neo_predprey.py does: a world that stops changing is
+reset. Reports steps/sec, the time per cell, which should stay flat as the
+grid grows, and the share of cells that were live (which are all a step
+visits) and the time per live cell. --set changes predprey_lib.Params, e.g.
+to make sparse worlds. With --batch, it times predprey_batch.BatchWorld
+stepping that many worlds at once instead (needs numpy), counting a step of
+each world.
+"""
+
+import argparse
+import random
+import time
+
+import predprey_lib
+from sweep_runs import parse_value
+
+
+# Returns the time taken, the number of resets and the mean live cells.
+def bench(size, steps, wrap=predprey_lib.WRAPAROUND, params=None):
+    world = predprey_lib.World(size, size, wrap, params)
+    resets, live = 0, 0
+    start = time.perf_counter()
+    for _ in range(steps):
+        live += world.nlive
+        changed = world.step()
+        world.frame += 1
+        if not changed:
+            world.reset_grid()
+            resets += 1
+    return time.perf_counter() - start, resets, live / steps
+
+
+def bench_batch(batch, size, steps, wrap=predprey_lib.WRAPAROUND, seed=None,
+                params=None):
+    import predprey_batch
+    world = predprey_batch.BatchWorld(batch, size, size, wrap, seed=seed,
+                                      **(params.as_dict() if params else {}))
+    resets = 0
+    start = time.perf_counter()
+    for _ in range(steps):
+        changed = world.step()
+        world.frame += 1
+        done = changed == 0
+        world.reset_grid(done)
+        resets += done.sum()
+    return time.perf_counter() - start, resets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[16, 32, 64, 128, 256],
+                        help='grid sides to run (default: 16 to 256)')
+    parser.add_argument('--steps', type=int, default=0,
+                        help='steps per size (default: about 2M cell updates)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--wrap', action='store_true',
+                        help='grids wrap around at the edges')
+    parser.add_argument('--set', action='append', default=[], metavar='NAME=VALUE',
+                        help='a predprey_lib.Params value')
+    parser.add_argument('--batch', type=int, default=0, metavar='WORLDS',
+                        help='time BatchWorld with this many worlds')
+    args = parser.parse_args()
+    values = {}
+    for item in args.set:
+        name, _, value = item.partition('=')
+        values[name] = parse_value(value)
+    try:
+        params = predprey_lib.Params(**values)
+    except TypeError as e:
+        parser.error(str(e))
+
+    print('{:>9} {:>7} {:>10} {:>9} {:>10} {:>7} {:>7} {:>8}'.format(
+        'grid', 'steps', 'steps/sec', 'ms/step', 'us/cell', 'resets',
+        'live %', 'us/live'))
+    for size in args.sizes:
+        if args.batch:
+            steps = args.steps or max(5, 20000000 // (size * size * args.batch))
+            secs, resets = bench_batch(args.batch, size, steps, args.wrap,
+                                       args.seed, params)
+            steps *= args.batch  # of single worlds, to compare with World
+            live = '-', '-'
+        else:
+            steps = args.steps or max(10, 2000000 // (size * size))
+            random.seed(args.seed)
+            secs, resets, nlive = bench(size, steps, args.wrap, params)
+            live = ('{:.0f}'.format(100 * nlive / (size * size)),
+                    '{:.3f}'.format(secs / steps / max(nlive, 1) * 1e6))
+        print('{:>9} {:>7} {:>10.1f} {:>9.2f} {:>10.3f} {:>7} {:>7} {:>8}'.format(
+            '{0}x{0}'.format(size), steps, steps / secs, secs / steps * 1e3,
+            secs / steps / (size * size) * 1e6, resets, *live))
+
+
+if __name__ == '__main__':
+    main()
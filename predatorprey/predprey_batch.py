@@ -0,0 +1,249 @@
+# The predprey_lib rules over a batch of independent worlds with numpy, for
+# parameter sweeps on the host (see sweep_predprey.py). Needs numpy; the
+# board never imports this.
+#
+# A step visits cells in a random order, doing cell i in every world at
+# once: each cell attribute is an array of (cells + 1, batch), so a cell's
+# state across the batch is a contiguous row, and each action works on just
+# the worlds whose cell i takes it. World visits its live cells in a random
+# order too, one it mostly keeps from step to step where this draws a new
+# one each step, shared by the batch; which cell acts first is as random in
+# both. Neighbors are picked with World's scan orders, so a batch of worlds
+# follows the same distribution as World runs (sweep_predprey.py --check),
+# only from a different random stream.
+
+import numpy as np
+
+import predprey_lib
+from predprey_lib import CELL_EMPTY, CELL_PREY, CELL_PREDATOR, CELL_TOMB, DIRS_LEN
+
+CELL_WALL = 255  # the padding cell that off-grid neighbors point to
+
+# The predprey_lib.Params a BatchWorld takes per world.
+PARAMS = predprey_lib.Params.NAMES
+
+# Bit d of a neighbor mask is set if the neighbor in direction d matches, so
+# these multiply a row of 0/1 matches per direction into its bit.
+_DIR_BITS = (1 << np.arange(DIRS_LEN, dtype=np.uint8))[:, None]
+
+# World.find_cell() returns the first match in one of the SCAN_ORDERS orders,
+# so PICK[mask * SCAN_ORDERS + order] is that direction for a mask of matches,
+# or DIRS_LEN (the cell itself) if there are none.
+PICK = np.full((256, predprey_lib.SCAN_ORDERS), DIRS_LEN, dtype=np.uint8)
+_orders = predprey_lib.scan_orders()
+for _m in range(1, 256):
+    for _o in range(predprey_lib.SCAN_ORDERS):
+        PICK[_m, _o] = next(d for d in _orders[_o * DIRS_LEN:(_o + 1) * DIRS_LEN]
+                            if _m >> d & 1)
+PICK = PICK.ravel()
+
+
+class BatchWorld(object):
+    # Params are predprey_lib.Params names, each a value for every world or
+    # a sequence of batch values, one per world. Those not given are the
+    # Params defaults.
+    def __init__(self, batch, rows=predprey_lib.GRID_ROWS,
+                 cols=predprey_lib.GRID_COLS, wrap=predprey_lib.WRAPAROUND,
+                 seed=None, **params):
+        unknown = set(params) - set(PARAMS)
+        if unknown:
+            raise TypeError('unknown params: {}'.format(', '.join(sorted(unknown))))
+        self.batch = batch
+        self.rows = rows
+        self.cols = cols
+        self.rng = np.random.default_rng(seed)
+        n = self.cells = rows * cols
+        defaults = predprey_lib.Params().as_dict()
+        self.params = {}
+        for name in PARAMS:
+            value = np.asarray(params.get(name, defaults[name]))
+            if name == 'prey_moves':
+                value = value.astype(bool)
+            self.params[name] = np.broadcast_to(value, (batch,))
+
+        # Neighbors as flat offsets (cell * batch), plus the cell itself as
+        # direction DIRS_LEN. Off-grid neighbors are cell n, a wall in every
+        # world.
+        nbr = np.array(predprey_lib.neighbor_table(rows, cols, wrap), dtype=np.intp)
+        nbr = nbr.reshape(n, DIRS_LEN)
+        nbr[nbr < 0] = n
+        self._cell_nbr = np.hstack((nbr, np.arange(n)[:, None]))
+
+        self.frame = np.zeros(batch, dtype=np.int32)
+        self.type = np.full((n + 1, batch), CELL_WALL, dtype=np.uint8)
+        self.birth = np.zeros((n + 1, batch), dtype=np.int32)
+        self.last_update = np.zeros((n + 1, batch), dtype=np.int32)
+        self.last_breed = np.zeros((n + 1, batch), dtype=np.int32)
+        self.last_feed = np.zeros((n + 1, batch), dtype=np.int32)
+        self._index()
+        self.reset_grid()
+
+    # Flat views of the cell attributes, indexed by cell * batch + world,
+    # and the neighbor offsets that go with them.
+    def _index(self):
+        self._nbr = self._cell_nbr * self.batch
+        self._attrs = [a.reshape(-1) for a in (
+            self.type, self.birth, self.last_update, self.last_breed, self.last_feed)]
+        (self._type, self._birth, self._last_update,
+         self._last_breed, self._last_feed) = self._attrs
+
+    # Drops all but the given worlds (a bool mask or indexes), which become
+    # worlds 0 up in the same order. For sweeps, so worlds that are done
+    # stop costing steps.
+    def keep(self, worlds):
+        if np.asarray(worlds).dtype == bool:
+            worlds = np.flatnonzero(worlds)
+        self.batch = len(worlds)
+        self.frame = self.frame[worlds]
+        for name in PARAMS:
+            self.params[name] = self.params[name][worlds]
+        for name in ('type', 'birth', 'last_update', 'last_breed', 'last_feed'):
+            setattr(self, name, np.ascontiguousarray(getattr(self, name)[:, worlds]))
+        self._index()
+
+    # Starts the given worlds (a bool mask or indexes, default all) over.
+    def reset_grid(self, worlds=None):
+        if worlds is None:
+            worlds = np.arange(self.batch)
+        elif np.asarray(worlds).dtype == bool:
+            worlds = np.flatnonzero(worlds)
+        if not len(worlds):
+            return
+        n = self.cells
+        shape = (n, len(worlds))
+        prey = self.rng.random(shape) < self.params['init_prey_frac'][worlds]
+        pred = self.rng.random(shape) < self.params['init_predator_frac'][worlds]
+        self.type[:n, worlds] = np.where(
+            prey, CELL_PREY, np.where(pred, CELL_PREDATOR, CELL_EMPTY))
+        self.frame[worlds] = 0
+        for attr in (self.birth, self.last_breed, self.last_feed):
+            attr[:n, worlds] = 0
+        self.last_update[:n, worlds] = -1
+
+    # Cell counts of typ, per world.
+    def count(self, typ):
+        return np.count_nonzero(self.type[:self.cells] == typ, axis=0)
+
+    # Returns the number of cells that acted in each world, like World.step().
+    def step(self):
+        frame = self.frame
+        types, last_update = self.type, self.last_update
+        # Tombs due this step empty before anything acts, as World's wheel
+        # empties them.
+        n = self.cells
+        due = ((types[:n] == CELL_TOMB)
+               & (frame - self.birth[:n] >= self.params['tomb_cycle']))
+        types[:n][due] = CELL_EMPTY
+        changed = []  # worlds, once per cell that acted
+        for i in self.rng.permutation(n):
+            typ = types[i]
+            # The worlds where cell i acts, found once and split by type.
+            w = np.flatnonzero(((typ == CELL_PREDATOR) | (typ == CELL_PREY))
+                               & (last_update[i] != frame))
+            last_update[i] = frame
+            if not len(w):
+                continue
+            typ = typ[w]
+            # One set of neighbor masks serves both predators and prey, since
+            # acting in one world leaves the others' cells as they were.
+            empty, tomb, prey = self._match(i, (CELL_EMPTY, CELL_TOMB, CELL_PREY))
+            pred = typ == CELL_PREDATOR
+            if pred.any():
+                wp = w[pred]
+                self._predator_action(i, wp, (empty[wp], tomb[wp], prey[wp]), changed)
+            prey_w = ~pred
+            if prey_w.any():
+                wp = w[prey_w]
+                self._prey_action(i, wp, empty[wp], changed)
+        if not changed:
+            return np.zeros(self.batch, dtype=np.intp)
+        return np.bincount(np.concatenate(changed), minlength=self.batch)
+
+    # Masks of which of cell i's neighbors are each of typs, in every world.
+    # The neighbors' rows stack into a (DIRS_LEN, batch) array, so a mask is
+    # a few whole-array operations rather than a gather per world.
+    def _match(self, i, typs):
+        near = self.type[self._cell_nbr[i, :DIRS_LEN]]
+        return [np.bitwise_or.reduce((near == typ) * _DIR_BITS, axis=0)
+                for typ in typs]
+
+    # Flat indexes of a neighbor of cell i from each world's mask, as
+    # World.find_cell() would pick it, or of cell i where the mask is empty.
+    def _pick(self, i, w, masks):
+        order = self.rng.integers(0, predprey_lib.SCAN_ORDERS, len(w))
+        pick = PICK[masks.astype(np.intp) * predprey_lib.SCAN_ORDERS + order]
+        return w + self._nbr[i, pick]
+
+    # Makes the cells at flat indexes idx (in worlds) new cells of typ, which
+    # act from the next step.
+    def _reset(self, worlds, idx, typ):
+        frame = self.frame[worlds]
+        self._type[idx] = typ
+        self._birth[idx] = frame
+        self._last_update[idx] = frame
+        self._last_breed[idx] = frame
+        self._last_feed[idx] = frame
+
+    # Makes the cells at flat indexes idx (in worlds) empty, or tombs where
+    # typ is CELL_TOMB. Only their type and birth (for a tomb's expiry)
+    # matter until a cell is born or moves into them, which sets the rest.
+    def _clear(self, worlds, idx, typ):
+        self._type[idx] = typ
+        self._birth[idx] = self.frame[worlds]
+
+    # Moves the cells at flat indexes src to dst, clearing src to typ. The
+    # caller sets the moved cells' last_update.
+    def _move(self, worlds, src, dst, typ):
+        for attr in (self._type, self._birth, self._last_breed, self._last_feed):
+            attr[dst] = attr[src]
+        self._clear(worlds, src, typ)
+
+    # Cell i's predators in worlds w, given its neighbor masks from step().
+    def _predator_action(self, i, w, masks, changed):
+        p = self.params
+        frame = self.frame
+        src = i * self.batch + w
+        empty, tomb, prey = masks
+        fed = prey != 0
+        # Eat a neighbor, starve, or move to an open cell.
+        starve = ~fed & (frame[w] - self._last_feed[src] >= p['predator_feed_cycle'][w])
+        self._type[src[starve]] = CELL_EMPTY
+        changed.append(w[starve])
+        live = ~starve
+        w, src, fed = w[live], src[live], fed[live]
+        pred = self._pick(i, w, np.where(fed, prey[live], empty[live] | tomb[live]))
+        moved = pred != src
+        left = np.where(fed & (p['tomb_cycle'][w] > 0), CELL_TOMB, CELL_EMPTY)
+        self._move(w[moved], src[moved], pred[moved], left[moved])
+        self._last_feed[pred[fed]] = frame[w[fed]]
+        self._last_update[pred] = frame[w]
+        changed.append(w[moved])
+        # Then maybe breed into an open cell around where it started.
+        breed = ((frame[w] - self._last_breed[pred] >= p['predator_breed_cycle'][w])
+                 & (self.rng.random(len(w)) < p['predator_breed_prob'][w]))
+        w, src, pred, moved = w[breed], src[breed], pred[breed], moved[breed]
+        if not len(w):
+            return
+        empty, tomb = self._match(i, (CELL_EMPTY, CELL_TOMB))
+        pos = self._pick(i, w, empty[w] | tomb[w])
+        ok = pos != src
+        w, pos, pred = w[ok], pos[ok], pred[ok]
+        self._reset(w, pos, CELL_PREDATOR)
+        self._last_breed[pred] = frame[w]
+        changed.append(w[~moved[ok]])
+
+    # Cell i's prey in worlds w, given its empty neighbors' masks.
+    def _prey_action(self, i, w, empty, changed):
+        p = self.params
+        frame = self.frame
+        found = empty != 0
+        w, empty = w[found], empty[found]
+        src = i * self.batch + w
+        pos = self._pick(i, w, empty)
+        # Breed into an empty neighbor once old enough, or move to it.
+        spawn = frame[w] - self._last_breed[src] >= p['prey_breed_cycle'][w]
+        self._reset(w[spawn], pos[spawn], CELL_PREY)
+        hop = ~spawn & p['prey_moves'][w]
+        self._move(w[hop], src[hop], pos[hop], CELL_EMPTY)
+        self._last_update[pos[hop]] = frame[w[hop]]
+        changed.append(w[spawn | hop])
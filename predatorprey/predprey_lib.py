@@ -0,0 +1,380 @@
+# The predator/prey world, without any hardware: neo_predprey.py draws it on
+# a LED panel, and it runs as-is on the host for bigger grids.
+#
+# The grid is a set of parallel flat arrays, one per cell attribute, indexed
+# by row * cols + col. A cell is just that index: moving one copies its
+# attributes to the new index, births and deaths overwrite them, so stepping
+# doesn't allocate, and a 16x16 world takes about 10KB, 4KB of it the
+# neighbor table.
+#
+# A step visits only the live (non-empty) cells, from a list kept up to date
+# as cells are born, move and die, so it costs in proportion to them rather
+# than to the grid. The list is in random order (a newborn goes in at a
+# random place, and a cell that moves keeps its place), and each step starts
+# at a random point in it, so no part of the grid always acts first. Cells
+# born during a step first act in the next one.
+
+import array
+import random
+
+# behavior config, the defaults for Params
+INIT_PREDATOR_FRAC = 0.10
+PREDATOR_FEED_CYCLE = 2
+PREDATOR_BREED_CYCLE = 4
+PREDATOR_BREED_PROB = 0.9
+INIT_PREY_FRAC = 0.08
+PREY_MOVES = True
+PREY_BREED_CYCLE = 2
+# PREY_BREED_PROB = 1.0
+TOMB_CYCLE = 5  # steps that dead prey cells stay empty
+
+# world config
+WRAPAROUND = False
+# SPAWN_OVER_PREY = False
+GRID_ROWS = 16
+GRID_COLS = GRID_ROWS
+
+# misc constants
+CELL_EMPTY = 0
+CELL_PREY = 1
+CELL_PREDATOR = 2
+CELL_TOMB = 3
+OPEN_TYPES = (CELL_EMPTY, CELL_TOMB)  # cells a predator can move or spawn into
+NEIGHBOR_DIRS = (
+  (-1, -1), (0, -1), (1, -1),
+  (-1, 0), (1, 0),
+  (-1, 1), (0, 1), (1, 1),
+)
+DIRS_LEN = len(NEIGHBOR_DIRS)
+# Neighbor searches visit directions in one of SCAN_ORDERS orders: each of
+# these, relabeled by adding 0-7 to every direction, forwards and backwards.
+# So every direction is visited first equally often and comes before each
+# other one half the time, and whichever of any set of matching neighbors is
+# found first is within 16% of uniform (these two were searched for that).
+SCAN_ORDER_BASES = ((1, 0, 3, 5, 7, 4, 6, 2), (7, 4, 2, 0, 1, 3, 6, 5))
+SCAN_ORDER_BITS = 5
+SCAN_ORDERS = 1 << SCAN_ORDER_BITS  # len(SCAN_ORDER_BASES) * DIRS_LEN * 2
+CELL_CHARS = ' _X?'  # by cell type, for print_ascii()
+
+
+# Neighbor index table for a rows x cols grid: DIRS_LEN entries per cell,
+# in NEIGHBOR_DIRS order, -1 past the edge when not wrapping around.
+def neighbor_table(rows, cols, wrap=WRAPAROUND):
+    table = index_array(rows * cols, 0)
+    for r in range(rows):
+        for c in range(cols):
+            for (rd, cd) in NEIGHBOR_DIRS:
+                r2, c2 = r + rd, c + cd
+                if wrap:
+                    r2 %= rows
+                    c2 %= cols
+                if 0 <= r2 < rows and 0 <= c2 < cols:
+                    table.append(r2 * cols + c2)
+                else:
+                    table.append(-1)
+    return table
+
+
+# An array of length values, of a type that holds the indexes of a grid of
+# cells cells, and -1.
+def index_array(cells, length, value=0):
+    return array.array('h' if cells <= 0x7fff else 'i', [value] * length)
+
+
+# Per-cell timers, for things due a fixed number of steps after they start
+# (tombs emptying, but also e.g. starvation or breeding): a ring of slots
+# buckets indexed by frame modulo slots, each a doubly linked list threaded
+# through per-cell next/prev arrays. Scheduling, cancelling and finding
+# what's due are O(1), and none of them allocate. A cell can be due at most
+# slots frames after it's scheduled, and only one timer per cell.
+class Wheel(object):
+    def __init__(self, cells, slots):
+        self.slots = slots
+        self.head = index_array(cells, slots, -1)
+        self.next = index_array(cells, cells, -1)
+        # The previous cell in the bucket, -2 - slot for the first, or -1 if
+        # not scheduled.
+        self.prev = index_array(cells, cells, -1)
+
+    def scheduled(self, i):
+        return self.prev[i] != -1
+
+    # Schedules cell i to be due at frame.
+    def schedule(self, i, frame):
+        s = frame % self.slots
+        j = self.head[s]
+        self.next[i] = j
+        self.prev[i] = -2 - s
+        if j >= 0:
+            self.prev[j] = i
+        self.head[s] = i
+
+    def cancel(self, i):
+        nxt, prev = self.next, self.prev
+        j, k = nxt[i], prev[i]
+        if k >= 0:
+            nxt[k] = j
+        else:
+            self.head[-2 - k] = j
+        if j >= 0:
+            prev[j] = k
+        prev[i] = -1
+
+    # A cell due at frame, or -1 once there are none. It stays scheduled
+    # until cancelled (or scheduled again), so handle it before the next.
+    def due(self, frame):
+        return self.head[frame % self.slots]
+
+
+# The SCAN_ORDERS orderings of range(DIRS_LEN), back to back.
+def scan_orders():
+    orders = bytearray()
+    for base in SCAN_ORDER_BASES:
+        for o in range(DIRS_LEN):
+            order = bytes((d + o) % DIRS_LEN for d in base)
+            orders.extend(order)
+            # bytearray.extend takes only buffers on CircuitPython.
+            orders.extend(bytes(reversed(order)))
+    return orders
+
+
+# A world's rules: the behavior config above, by lowercase name. Any given
+# override the constant for just that World, so worlds with different rules
+# can run side by side (see sweep_runs.py).
+class Params(object):
+    NAMES = (
+        'init_predator_frac',
+        'predator_feed_cycle',
+        'predator_breed_cycle',
+        'predator_breed_prob',
+        'init_prey_frac',
+        'prey_moves',
+        'prey_breed_cycle',
+        'tomb_cycle',
+    )
+
+    def __init__(self, **values):
+        for name in self.NAMES:
+            setattr(self, name, values.pop(name, globals()[name.upper()]))
+        if values:
+            raise TypeError('unknown params: ' + ', '.join(sorted(values)))
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.NAMES}
+
+
+class World(object):
+    # rng is where the world's randomness comes from: the random module, or
+    # for a world that can be replayed anywhere, a seeded lib/rng.py Rng.
+    def __init__(self, rows=GRID_ROWS, cols=GRID_COLS, wrap=WRAPAROUND,
+                 params=None, rng=random):
+        self.rows = rows
+        self.cols = cols
+        self.params = params or Params()
+        self.rng = rng
+        n = rows * cols
+        self.frame = 0  # steps since reset_grid()
+        self.type = bytearray(n)
+        self.birth = array.array('i', [0] * n)
+        self.last_update = array.array('i', [-1] * n)
+        self.last_breed = array.array('i', [0] * n)
+        self.last_feed = array.array('i', [0] * n)  # predator-only
+        # The live cells are live[:nlive], and slot[i] is where cell i is in
+        # it, or -1. A step visits a copy, order, as the list changes.
+        self.live = index_array(n, n)
+        self.slot = index_array(n, n, -1)
+        self.nlive = 0
+        self.order = index_array(n, n)
+        # Tombs by the frame they empty in. They stay in the live list too,
+        # in their places, so the visit order is as if they were live.
+        self.tombs = Wheel(n, max(1, self.params.tomb_cycle))
+        # Neighbor searches look up neighbors[DIRS_LEN * i + d], visiting d
+        # in one of the precomputed scan orders picked at random per search,
+        # rather than shuffling directions and bounds checking each time.
+        self.neighbors = neighbor_table(rows, cols, wrap)
+        self.orders = scan_orders()
+        self.reset_grid()
+
+    def reset_grid(self):
+        self.frame = 0
+        prey_frac = self.params.init_prey_frac
+        predator_frac = self.params.init_predator_frac
+        rand = self.rng.random
+        for i in range(self.rows * self.cols):
+            if rand() < prey_frac: t = CELL_PREY
+            elif rand() < predator_frac: t = CELL_PREDATOR
+            else: t = CELL_EMPTY
+            self.reset(i, t)
+            self.last_update[i] = -1  # all act in the first step
+
+    # Makes cell i a brand new cell of typ, which acts from the next step.
+    def reset(self, i, typ):
+        frame = self.frame
+        if self.type[i] == CELL_TOMB:
+            self.tombs.cancel(i)
+        if typ == CELL_TOMB:
+            self.tombs.schedule(i, frame + self.params.tomb_cycle)
+        self.type[i] = typ
+        self.birth[i] = frame
+        self.last_update[i] = frame
+        self.last_breed[i] = frame
+        self.last_feed[i] = frame
+        if typ == CELL_EMPTY:
+            if self.slot[i] >= 0: self._unlist(i)
+        elif self.slot[i] < 0: self._list(i)
+
+    # Moves the cell at i to j, and makes i a new cell of typ.
+    def move(self, i, j, typ):
+        if self.type[j] == CELL_TOMB:
+            self.tombs.cancel(j)
+        self.type[j] = self.type[i]
+        self.birth[j] = self.birth[i]
+        self.last_update[j] = self.last_update[i]
+        self.last_breed[j] = self.last_breed[i]
+        self.last_feed[j] = self.last_feed[i]
+        slot = self.slot
+        if slot[j] < 0:
+            if typ == CELL_EMPTY:
+                # j takes i's place in the live list.
+                slot[j] = slot[i]
+                self.live[slot[j]] = j
+                slot[i] = -1
+            else:
+                self._list(j)
+        self.reset(i, typ)
+
+    # Puts i in the live list at a random place (inside-out Fisher-Yates),
+    # moving the one there to the end.
+    def _list(self, i):
+        live, slot = self.live, self.slot
+        n = self.nlive
+        k = int(self.rng.random() * (n + 1))
+        if k < n:
+            live[n] = live[k]
+            slot[live[n]] = n
+        live[k] = i
+        slot[i] = k
+        self.nlive = n + 1
+
+    # Takes i out of the live list, filling its place with the last one.
+    def _unlist(self, i):
+        live, slot = self.live, self.slot
+        self.nlive -= 1
+        last = live[self.nlive]
+        live[slot[i]] = last
+        slot[last] = slot[i]
+        slot[i] = -1
+
+    def print_ascii(self):
+        print('\n', self.frame)
+        cols = self.cols
+        for r in range(self.rows):
+            print(''.join(CELL_CHARS[t] for t in self.type[r * cols:(r + 1) * cols]))
+
+    # Returns the index of a random neighbor of cell i of type typ, or -1.
+    def find_cell(self, i, typ):
+        types, neighbors, orders = self.type, self.neighbors, self.orders
+        base = DIRS_LEN * i
+        o = DIRS_LEN * self.rng.getrandbits(SCAN_ORDER_BITS)
+        for k in range(o, o + DIRS_LEN):
+            j = neighbors[base + orders[k]]
+            if j >= 0 and types[j] == typ:
+                return j
+        return -1
+
+    def find_cell_multi(self, i, typs):
+        types, neighbors, orders = self.type, self.neighbors, self.orders
+        base = DIRS_LEN * i
+        o = DIRS_LEN * self.rng.getrandbits(SCAN_ORDER_BITS)
+        for k in range(o, o + DIRS_LEN):
+            j = neighbors[base + orders[k]]
+            if j >= 0 and types[j] in typs:
+                return j
+        return -1
+
+    # Returns the number of cells that acted (0 if nothing changed).
+    def step(self):
+        frame = self.frame
+        types, last_update = self.type, self.last_update
+        # Tombs due this step empty before anything acts. tomb->empty doesn't
+        # count as a change.
+        tombs = self.tombs
+        i = tombs.due(frame)
+        while i >= 0:
+            self.reset(i, CELL_EMPTY)
+            i = tombs.due(frame)
+        # The live list from a random point, wrapping around. Cells that
+        # have moved into or been born in a cell since are marked updated.
+        order, live, n = self.order, self.live, self.nlive
+        start = int(self.rng.random() * n)
+        for k in range(start, n):
+            order[k - start] = live[k]
+        for k in range(start):
+            order[n - start + k] = live[k]
+        changed = 0
+        for k in range(n):
+            i = order[k]
+            typ = types[i]
+            if last_update[i] == frame: pass
+            elif typ == CELL_PREDATOR:
+                if self.predator_action(i): changed += 1
+            elif typ == CELL_PREY:
+                if self.prey_action(i): changed += 1
+            last_update[i] = frame
+        return changed
+
+    def predator_action(self, i):
+        p = self.params
+        frame = self.frame
+        changed = False
+        pred = i  # where the predator is now
+        prey_pos = self.find_cell(i, CELL_PREY)
+        if prey_pos >= 0:
+            # move and eat prey
+            self.move(i, prey_pos, CELL_TOMB if (p.tomb_cycle > 0) else CELL_EMPTY)
+            pred = prey_pos
+            self.last_feed[pred] = frame
+            changed = True
+        elif frame - self.last_feed[i] >= p.predator_feed_cycle:
+            # die
+            self.reset(i, CELL_EMPTY)
+            changed = True
+            return changed
+        else:
+            # move to random empty cell
+            pos = self.find_cell_multi(i, OPEN_TYPES)
+            if pos >= 0:
+                self.move(i, pos, CELL_EMPTY)
+                pred = pos
+                changed = True
+        # It's acted, wherever it went.
+        self.last_update[pred] = frame
+
+        if (frame - self.last_breed[pred] >= p.predator_breed_cycle
+            and self.rng.random() < p.predator_breed_prob):
+            pos = self.find_cell_multi(i, OPEN_TYPES)
+            # Prefer to spawn into empty space, but spawn over a prey cell if necessary.
+            # if pos < 0 and SPAWN_OVER_PREY:
+            #     pos = self.find_cell(i, CELL_PREY)
+            if pos >= 0:
+                self.reset(pos, CELL_PREDATOR)
+                self.last_breed[pred] = frame
+                changed = True
+        return changed
+
+    def prey_action(self, i):
+        p = self.params
+        changed = False
+        empty_pos = self.find_cell(i, CELL_EMPTY)
+        if (self.frame - self.last_breed[i] >= p.prey_breed_cycle
+            and empty_pos >= 0):
+            # and random.random() < PREY_BREED_PROB):
+            # breed. The parent's last_breed isn't reset, so once it's old
+            # enough it breeds whenever there's room.
+            self.reset(empty_pos, CELL_PREY)
+            changed = True
+        elif empty_pos >= 0 and p.prey_moves:
+            self.move(i, empty_pos, CELL_EMPTY)
+            self.last_update[empty_pos] = self.frame
+            changed = True
+        return changed
@@ -0,0 +1,272 @@
+"""Sweep predator/prey parameters over many simulated worlds (host only).
+
+    python predatorprey/sweep_predprey.py --set predator_feed_cycle=2,3,4 --set tomb_cycle=0,5
+    python predatorprey/sweep_predprey.py --set init_prey_frac=0.05,0.1,0.2 --worlds 2000
+    python predatorprey/sweep_predprey.py --check
+
+Every combination of the --set values (the rest are predprey_lib.Params
+defaults) runs in --worlds independent worlds on predprey_batch.BatchWorld,
+each for one life: until a step changes nothing, which is when
+neo_predprey.py starts a new world, or --steps. Per combination it reports
+the share of worlds that ran out and their mean steps to reset and to
+predator extinction (both capped at --steps, with standard errors), the
+mean prey and predator counts, how much those swing (coefficient of
+variation), and the predators' mean oscillation period (twice the steps
+between crossings of a moving average).
+
+--check runs the same worlds on predprey_lib.World, which the board runs,
+and on BatchWorld, and compares the two: each statistic's difference in
+standard errors, and a two-sample Kolmogorov-Smirnov test on the steps to
+reset. The two draw from different random streams, so single worlds
+differ, but these shouldn't. hostsim/golden.py runs a smaller --check with
+its other checks.
+
+Needs numpy. sweep_runs.py sweeps on World instead, across processes.
+"""
+
+import argparse
+import math
+import random
+import sys
+import time
+
+import numpy as np
+
+import predprey_batch
+import predprey_lib
+from sweep_runs import fmt, parse_sets
+
+# Weight of each step in the moving average that oscillations cross.
+EMA_ALPHA = 0.1
+
+
+# Per-world statistics over one life each, for worlds stepped in lockstep.
+class Tally(object):
+    def __init__(self, worlds, steps):
+        self.steps = steps
+        self.alive = np.ones(worlds, dtype=bool)
+        self.life = np.zeros(worlds, dtype=np.int64)  # steps taken
+        self.pred_gone = np.full(worlds, steps, dtype=np.int64)
+        self.sums = np.zeros((4, worlds))  # prey, prey^2, predators, predators^2
+        self.ema = np.zeros(worlds)
+        self.side = np.zeros(worlds, dtype=np.int8)  # of the ema: -1, 1, or 0 not yet
+        self.crossings = np.zeros(worlds, dtype=np.int64)
+
+    # Counts after a step of worlds ids, and their changed cells. Worlds that
+    # didn't change have reset and stop counting.
+    def add(self, ids, prey, pred, changed):
+        live = self.alive[ids]
+        ids = ids[live]
+        prey = np.asarray(prey, dtype=float)[live]
+        pred = np.asarray(pred, dtype=float)[live]
+        changed = np.asarray(changed)[live]
+        self.life[ids] += 1
+        gone = ids[(pred == 0) & (self.pred_gone[ids] == self.steps)]
+        self.pred_gone[gone] = self.life[gone]
+        for (k, x) in enumerate((prey, prey * prey, pred, pred * pred)):
+            self.sums[k, ids] += x
+        ema = np.where(self.life[ids] == 1, pred, self.ema[ids])
+        ema += EMA_ALPHA * (pred - ema)
+        side = np.sign(pred - ema).astype(np.int8)
+        was = self.side[ids]
+        self.crossings[ids] += (side * was) < 0
+        self.side[ids] = np.where(side != 0, side, was)
+        self.ema[ids] = ema
+        self.alive[ids] = changed > 0
+
+    # Statistics for the worlds in sel (default all), as (name, mean,
+    # standard error) with se None where it doesn't apply.
+    def summary(self, sel=slice(None)):
+        life = self.life[sel]
+        n = len(life)
+        prey_mean = self.sums[0][sel] / life
+        prey_var = np.maximum(self.sums[1][sel] / life - prey_mean ** 2, 0)
+        pred_mean = self.sums[2][sel] / life
+        pred_var = np.maximum(self.sums[3][sel] / life - pred_mean ** 2, 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            prey_cv = np.where(prey_mean > 0, np.sqrt(prey_var) / prey_mean, 0)
+            pred_cv = np.where(pred_mean > 0, np.sqrt(pred_var) / pred_mean, 0)
+        cycles = self.crossings[sel] >= 2
+        period = 2 * life[cycles] / self.crossings[sel][cycles]
+        stats = [('worlds', n, None),
+                 ('reset %', 100 * np.mean(~self.alive[sel]), None)]
+        for (name, x) in (('steps to reset', life),
+                          ('steps to no predators', self.pred_gone[sel]),
+                          ('prey', prey_mean), ('predators', pred_mean),
+                          ('prey cv', prey_cv), ('predator cv', pred_cv),
+                          ('predator period', period)):
+            if len(x):
+                stats.append((name, np.mean(x), np.std(x) / math.sqrt(len(x))))
+            else:
+                stats.append((name, float('nan'), None))
+        return stats
+
+
+# Runs worlds lives for each combo on BatchWorlds and returns a Tally over
+# all of them, combo-major. Combos share a batch of up to args.batch worlds,
+# and a world whose life is over starts its combo's next one, so the batch
+# stays full until the last lives.
+def run_batch(combos, args):
+    tallies = []
+    per_chunk = max(1, args.batch // args.worlds)
+    for start in range(0, len(combos), per_chunk):
+        chunk = combos[start:start + per_chunk]
+        slots = max(1, min(args.worlds, args.batch // len(chunk)))  # per combo
+        params = {}
+        for name in chunk[0]:
+            params[name] = np.repeat([c[name] for c in chunk], slots)
+        world = predprey_batch.BatchWorld(
+            len(chunk) * slots, args.size, args.size, args.wrap,
+            seed=args.seed + start, **params)
+        tally = Tally(len(chunk) * args.worlds, args.steps)
+        combo = np.repeat(np.arange(len(chunk)), slots)  # of each world
+        ids = combo * args.worlds + np.tile(np.arange(slots), len(chunk))
+        started = np.full(len(chunk), slots)  # lives per combo so far
+        idle = np.zeros(len(ids), dtype=bool)
+        while True:
+            changed = world.step()
+            world.frame += 1
+            tally.add(ids[~idle], world.count(predprey_lib.CELL_PREY)[~idle],
+                      world.count(predprey_lib.CELL_PREDATOR)[~idle], changed[~idle])
+            over = ~idle & (~tally.alive[ids] | (tally.life[ids] >= args.steps))
+            restart = []
+            for k in np.flatnonzero(over):
+                c = combo[k]
+                if started[c] < args.worlds:
+                    ids[k] = c * args.worlds + started[c]
+                    started[c] += 1
+                    restart.append(k)
+                else:
+                    idle[k] = True
+            world.reset_grid(np.array(restart, dtype=np.intp))
+            if idle.all():
+                break
+            if idle.sum() >= len(ids) // 2:
+                world.keep(~idle)
+                combo, ids = combo[~idle], ids[~idle]
+                idle = idle[~idle]
+        tallies.append(tally)
+    return _concat(tallies, args.steps)
+
+
+# The same for the scalar engine, one combo.
+def run_scalar(combo, args):
+    random.seed(args.seed)
+    params = predprey_lib.Params(**combo)
+    worlds = [predprey_lib.World(args.size, args.size, args.wrap, params)
+              for _ in range(args.worlds)]
+    tally = Tally(len(worlds), args.steps)
+    for _ in range(args.steps):
+        ids = np.flatnonzero(tally.alive)
+        if not len(ids):
+            break
+        changed = []
+        for k in ids:
+            changed.append(worlds[k].step())
+            worlds[k].frame += 1
+        tally.add(ids,
+                  [worlds[k].type.count(predprey_lib.CELL_PREY) for k in ids],
+                  [worlds[k].type.count(predprey_lib.CELL_PREDATOR) for k in ids],
+                  changed)
+    return tally
+
+
+def _concat(tallies, steps):
+    out = Tally(sum(len(t.life) for t in tallies), steps)
+    for attr in ('alive', 'life', 'pred_gone', 'ema', 'side', 'crossings'):
+        setattr(out, attr, np.concatenate([getattr(t, attr) for t in tallies]))
+    out.sums = np.concatenate([t.sums for t in tallies], axis=1)
+    return out
+
+
+# Two-sample Kolmogorov-Smirnov statistic, and its 1% critical value.
+def ks_test(a, b):
+    a, b = np.sort(a), np.sort(b)
+    values = np.concatenate((a, b))
+    d = np.max(np.abs(np.searchsorted(a, values, side='right') / len(a)
+                      - np.searchsorted(b, values, side='right') / len(b)))
+    return d, 1.63 * math.sqrt((len(a) + len(b)) / (len(a) * len(b)))
+
+
+def sweep(args):
+    combos = parse_sets(args.set, predprey_batch.PARAMS)
+    start = time.perf_counter()
+    tally = run_batch(combos, args)
+    secs = time.perf_counter() - start
+    header = None
+    for (k, combo) in enumerate(combos):
+        stats = tally.summary(slice(k * args.worlds, (k + 1) * args.worlds))
+        if header is None:
+            header = list(combo) + [s[0] for s in stats]
+            print('\t'.join(header))
+        print('\t'.join([str(v) for v in combo.values()]
+                        + [fmt(mean, se) for (_, mean, se) in stats]))
+    print('{} worlds, {} world-steps in {:.1f}s'.format(
+        len(tally.life), tally.life.sum(), secs), file=sys.stderr)
+
+
+def check(args):
+    combos = parse_sets(args.set, predprey_batch.PARAMS)
+    ok = True
+    for combo in combos:
+        start = time.perf_counter()
+        scalar = run_scalar(combo, args)
+        scalar_secs = time.perf_counter() - start
+        start = time.perf_counter()
+        batch = run_batch([combo], args)
+        batch_secs = time.perf_counter() - start
+        print('params: {}'.format(combo or 'predprey_lib defaults'))
+        print('{:>24} {:>16} {:>16} {:>6}'.format('', 'World', 'BatchWorld', 'z'))
+        for ((name, m1, se1), (_, m2, se2)) in zip(scalar.summary(), batch.summary()):
+            if se1 is None:
+                print('{:>24} {:>16} {:>16}'.format(name, fmt(m1, None), fmt(m2, None)))
+                continue
+            se = math.hypot(se1, se2)
+            z = (m2 - m1) / se if se else 0.0
+            bad = abs(z) > args.max_z
+            ok &= not bad
+            print('{:>24} {:>16} {:>16} {:>6.2f}{}'.format(
+                name, fmt(m1, se1), fmt(m2, se2), z, '  <--' if bad else ''))
+        d, crit = ks_test(scalar.life, batch.life)
+        ok &= d <= crit
+        print('{:>24} D={:.3f} (1% critical {:.3f}){}'.format(
+            'KS steps to reset', d, crit, '  <--' if d > crit else ''))
+        print('{:>24} {:>16.0f} {:>16.0f}'.format(
+            'world-steps/sec', scalar.life.sum() / scalar_secs,
+            batch.life.sum() / batch_secs))
+    print('ok' if ok else 'MISMATCH')
+    return ok
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--set', action='append', default=[],
+                        metavar='NAME=V1,V2,...',
+                        help='values to sweep for a predprey_lib.Params name')
+    parser.add_argument('--worlds', type=int, default=500,
+                        help='worlds per parameter set (default 500)')
+    parser.add_argument('--steps', type=int, default=2000,
+                        help='most steps per world (default 2000)')
+    parser.add_argument('--size', type=int, default=predprey_lib.GRID_ROWS,
+                        help='grid side (default the panel\'s)')
+    parser.add_argument('--wrap', action='store_true',
+                        help='grids wrap around at the edges')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--batch', type=int, default=16384,
+                        help='most worlds to step at once (default 16384)')
+    parser.add_argument('--check', action='store_true',
+                        help='compare BatchWorld against World instead')
+    parser.add_argument('--max-z', type=float, default=3.5,
+                        help='--check: largest allowed difference, in standard errors')
+    return parser
+
+
+def main():
+    args = make_parser().parse_args()
+    if args.check:
+        sys.exit(0 if check(args) else 1)
+    sweep(args)
+
+
+if __name__ == '__main__':
+    main()
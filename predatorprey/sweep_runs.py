@@ -0,0 +1,284 @@
+"""Sweep predator/prey parameters on World across processes (host only).
+
+    python predatorprey/sweep_runs.py --out runs.csv --set predator_feed_cycle=2,3,4 --set wrap=False,True
+    python predatorprey/sweep_runs.py --out runs.jsonl --set size=16,32,64 --worlds 200 --jobs 8
+
+Every combination of the --set values (predprey_lib.Params names, plus size
+and wrap; the rest are the Params defaults, --size and --wrap) runs in
+--worlds independent predprey_lib.World runs, each for one life like in
+sweep_predprey.py. Runs are spread over a pool of --jobs processes, and each
+one's result is appended to --out as it finishes: a CSV row, or a JSON line
+if the name ends in .jsonl. Then it prints the same per-combination summary
+as sweep_predprey.py.
+
+Each run is seeded from --seed and its own parameters and number, so it
+comes out the same whatever else is in the sweep, however many processes
+run it, and in whatever order. Running a sweep again with the same --out
+skips the runs already in it, so an interrupted sweep picks up where it
+stopped, and a grown one only runs what's new.
+
+Only needs the standard library, unlike sweep_predprey.py's numpy batches:
+those are faster per core, this uses every core and any interpreter.
+"""
+
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+import signal
+import sys
+import time
+
+import predprey_lib
+
+# Weight of each step in the moving average that oscillations cross.
+EMA_ALPHA = 0.1
+
+# Sweepable run settings besides the Params.
+WORLD_AXES = ('size', 'wrap')
+
+# Fields of a result row, in CSV column order.
+COLUMNS = (('seed', 'run', 'steps') + WORLD_AXES + predprey_lib.Params.NAMES
+           + ('life', 'reset', 'pred_gone', 'prey', 'predators',
+              'prey_cv', 'predator_cv', 'crossings'))
+
+
+# The seed for run number run of a combination with the given size, wrap and
+# params (all of them, as a dict).
+def run_seed(base, size, wrap, params, run):
+    key = repr((base, size, wrap, sorted(params.items()), run))
+    return int.from_bytes(hashlib.sha256(key.encode()).digest()[:8], 'big')
+
+
+# Runs one world for one life and returns its result row. Statistics are
+# those of sweep_predprey.Tally for a single world.
+def run_world(task):
+    (seed, run, steps, size, wrap, params) = task
+    random.seed(seed)
+    world = predprey_lib.World(size, size, wrap, predprey_lib.Params(**params))
+    life, pred_gone, changed = 0, steps, 1
+    sums = [0, 0, 0, 0]  # prey, prey^2, predators, predators^2
+    ema, side, crossings = 0.0, 0, 0
+    while changed and life < steps:
+        changed = world.step()
+        world.frame += 1
+        life += 1
+        prey = world.type.count(predprey_lib.CELL_PREY)
+        pred = world.type.count(predprey_lib.CELL_PREDATOR)
+        if pred == 0 and pred_gone == steps:
+            pred_gone = life
+        sums[0] += prey
+        sums[1] += prey * prey
+        sums[2] += pred
+        sums[3] += pred * pred
+        if life == 1:
+            ema = pred
+        ema += EMA_ALPHA * (pred - ema)
+        s = (pred > ema) - (pred < ema)
+        if s * side < 0:
+            crossings += 1
+        if s:
+            side = s
+    row = {'seed': seed, 'run': run, 'steps': steps, 'size': size, 'wrap': wrap}
+    row.update(params)
+    prey_mean, pred_mean = sums[0] / life, sums[2] / life
+    row.update(life=life, reset=int(not changed), pred_gone=pred_gone,
+               prey=prey_mean, predators=pred_mean,
+               prey_cv=_cv(prey_mean, sums[1] / life),
+               predator_cv=_cv(pred_mean, sums[3] / life),
+               crossings=crossings)
+    return row
+
+
+def _cv(mean, mean_sq):
+    if mean <= 0:
+        return 0.0
+    return math.sqrt(max(mean_sq - mean * mean, 0)) / mean
+
+
+# Result rows in a file: the ones already there, then new ones appended and
+# flushed one at a time, so an interrupted sweep loses only runs in flight.
+class Results(object):
+    def __init__(self, path):
+        self.jsonl = path.endswith('.jsonl')
+        self.rows = self._read(path) if os.path.exists(path) else []
+        self.file = open(path, 'a', newline='')
+        if self.jsonl:
+            self.writer = None
+        else:
+            self.writer = csv.DictWriter(self.file, COLUMNS)
+            if not self.file.tell():
+                self.writer.writeheader()
+
+    def _read(self, path):
+        # A run killed mid-write can leave a partial last line; drop it.
+        with open(path, 'r+b') as f:
+            data = f.read()
+            end = data.rfind(b'\n') + 1
+            if end < len(data):
+                f.truncate(end)
+        lines = data[:end].decode().splitlines()
+        if self.jsonl:
+            return [json.loads(line) for line in lines if line]
+        if lines and tuple(next(csv.reader(lines[:1]))) != COLUMNS:
+            sys.exit('{} has other columns; sweep into a new file'.format(path))
+        return list(csv.DictReader(lines))
+
+    def add(self, row):
+        if self.jsonl:
+            self.file.write(json.dumps(row) + '\n')
+        else:
+            self.writer.writerow(row)
+        self.file.flush()
+        self.rows.append(row)
+
+    def close(self):
+        self.file.close()
+
+
+def parse_value(text):
+    if text in ('True', 'False'):
+        return text == 'True'
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+# Every combination of the --set NAME=V1,V2,... values, as dicts, for NAME
+# one of names.
+def parse_sets(sets, names):
+    axes = []
+    for item in sets:
+        name, _, values = item.partition('=')
+        if name not in names or not values:
+            sys.exit('--set wants NAME=V1,V2,... with NAME one of: {}'.format(
+                ', '.join(names)))
+        axes.append((name, [parse_value(v) for v in values.split(',')]))
+    return [dict(zip([a[0] for a in axes], values))
+            for values in itertools.product(*[a[1] for a in axes])]
+
+
+def fmt(mean, se):
+    if se is None:
+        return '{:.0f}'.format(mean)
+    return '{:.2f}+-{:.2f}'.format(mean, se) if abs(mean) < 10 else \
+        '{:.1f}+-{:.1f}'.format(mean, se)
+
+
+# Statistics over result rows, as sweep_predprey.Tally.summary() reports
+# them.
+def summary(rows):
+    def column(name):
+        return [float(r[name]) for r in rows]
+    period = [2 * float(r['life']) / float(r['crossings'])
+              for r in rows if float(r['crossings']) >= 2]
+    stats = [('worlds', len(rows), None),
+             ('reset %', 100 * sum(column('reset')) / max(len(rows), 1), None)]
+    for (name, x) in (('steps to reset', column('life')),
+                      ('steps to no predators', column('pred_gone')),
+                      ('prey', column('prey')), ('predators', column('predators')),
+                      ('prey cv', column('prey_cv')),
+                      ('predator cv', column('predator_cv')),
+                      ('predator period', period)):
+        if x:
+            mean = sum(x) / len(x)
+            sd = math.sqrt(sum((v - mean) ** 2 for v in x) / len(x))
+            stats.append((name, mean, sd / math.sqrt(len(x))))
+        else:
+            stats.append((name, float('nan'), None))
+    return stats
+
+
+# Workers leave Ctrl-C to the parent, which stops the pool.
+def _init_worker():
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def sweep(args):
+    combos = parse_sets(args.set, WORLD_AXES + predprey_lib.Params.NAMES)
+    defaults = predprey_lib.Params().as_dict()
+    plan = []  # (combo index, task)
+    for (k, combo) in enumerate(combos):
+        size = combo.get('size', args.size)
+        wrap = combo.get('wrap', args.wrap)
+        params = dict(defaults)
+        params.update((n, v) for (n, v) in combo.items() if n not in WORLD_AXES)
+        predprey_lib.Params(**params)  # fail on a bad value before forking
+        for run in range(args.worlds):
+            seed = run_seed(args.seed, size, wrap, params, run)
+            plan.append((k, (seed, run, args.steps, size, wrap, params)))
+
+    results = Results(args.out)
+    done = {(int(r['seed']), int(r['steps'])) for r in results.rows}
+    todo = [task for (_, task) in plan if (task[0], task[2]) not in done]
+    print('{} runs, {} already in {}'.format(
+        len(plan), len(plan) - len(todo), args.out), file=sys.stderr)
+
+    start = last = time.perf_counter()
+    world_steps = 0
+    pool = None
+    try:
+        if args.jobs > 1 and len(todo) > 1:
+            pool = multiprocessing.Pool(args.jobs, _init_worker)
+            chunk = max(1, min(8, len(todo) // (args.jobs * 4)))
+            rows = pool.imap_unordered(run_world, todo, chunk)
+        else:
+            rows = map(run_world, todo)
+        for (n, row) in enumerate(rows, 1):
+            results.add(row)
+            world_steps += row['life']
+            now = time.perf_counter()
+            if now - last >= 5 or n == len(todo):
+                last = now
+                print('{}/{} runs, {:.0f} world-steps/sec'.format(
+                    n, len(todo), world_steps / (now - start)), file=sys.stderr)
+    except KeyboardInterrupt:
+        sys.exit('interrupted; run again with --out {} to resume'.format(args.out))
+    finally:
+        if pool is not None:
+            pool.terminate()
+        results.close()
+
+    by_run = {(int(r['seed']), int(r['steps'])): r for r in results.rows}
+    header = None
+    for (k, combo) in enumerate(combos):
+        rows = [by_run[(task[0], task[2])] for (c, task) in plan if c == k]
+        stats = summary(rows)
+        if header is None:
+            header = list(combo) + [s[0] for s in stats]
+            print('\t'.join(header))
+        print('\t'.join([str(v) for v in combo.values()]
+                        + [fmt(mean, se) for (_, mean, se) in stats]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--out', required=True,
+                        help='results file to append to and resume from '
+                             '(.csv, or .jsonl for JSON lines)')
+    parser.add_argument('--set', action='append', default=[],
+                        metavar='NAME=V1,V2,...',
+                        help='values to sweep for a predprey_lib.Params name, '
+                             'size or wrap')
+    parser.add_argument('--worlds', type=int, default=100,
+                        help='runs per parameter set (default 100)')
+    parser.add_argument('--steps', type=int, default=2000,
+                        help='most steps per run (default 2000)')
+    parser.add_argument('--size', type=int, default=predprey_lib.GRID_ROWS,
+                        help='grid side (default the panel\'s)')
+    parser.add_argument('--wrap', action='store_true',
+                        help='grids wrap around at the edges')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1,
+                        help='processes to run on (default one per core)')
+    sweep(parser.parse_args())
+
+
+if __name__ == '__main__':
+    main()
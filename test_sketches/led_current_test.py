@@ -7,6 +7,9 @@ https://docs.google.com/spreadsheets/d/1evpuS2nY_CQLP2FsEA-JiHZUygXih2IOLr_ESvv3
 
 Turning down saturation (scaling the RGB values down) seems effectively the same
 as scaling down the brightness.
+
+The per-channel and idle figures feed the current model in
+bikeleds/accel_leds.py (LED_CHANNEL_UA, LED_IDLE_MA).
 """
 
 import analogio